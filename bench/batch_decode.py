@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+    Микробенчмарк пакетного разбора кадров датчиков.
+
+    Сравнивает разбор по одному кадру (parse_header и
+    convert_battery/convert_data экземпляра датчика) с пакетным разбором rpi.batch_decode на смеси
+    кадров датчиков температуры, освещенности, двери, электроэнергии и
+    воды, включая кадры с кодом ошибки. Результаты обоих вариантов
+    сверяются.
+
+    Запуск из корня репозитория:
+        python -m bench.batch_decode --frames 1000000
+"""
+import argparse
+import math
+import random
+from timeit import default_timer
+
+from rpi import batch_decode
+from rpi.frame import parse_header, SRC
+from rpi.sencors import SENCOR_TYPES, ERROR_CODE, SencorStatus
+
+
+def make_frames(count, kinds):
+    """ Синтетические кадры [dst, src, type, seq, bat, d0, d1, d2, d3] """
+    frames = []
+    for i in range(count):
+        __src = 1 + i % len(kinds)
+        if random.random() < 0.01:
+            __data = [ERROR_CODE, 0, ERROR_CODE, 0]
+        else:
+            __value = random.randrange(1 << 32)
+            __data = [(__value >> shift) & 0xFF for shift in (0, 8, 16, 24)]
+        frames.append(bytearray([0, __src, 0, i & 0xFF,
+                                 random.randrange(256)] + __data))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=1000000)
+    args = parser.parse_args()
+
+    # Один датчик каждого типа, радиоидентификаторы 1..5
+    sencors = {}
+    for __id, __kind in enumerate(batch_decode.KINDS, 1):
+        sencors[__id] = SENCOR_TYPES[__kind](__id, 'bench', __kind)
+    kinds = dict((__id, snc.type) for __id, snc in sencors.items())
+    frames = make_frames(args.frames, batch_decode.KINDS)
+
+    start = default_timer()
+    single = []
+    for packet in frames:
+        __snc = sencors[parse_header(packet)[SRC]]
+        __snc.convert_battery(packet)
+        __snc.convert_data(packet)
+        single.append((__snc.battery, __snc.value
+                       if __snc.status == SencorStatus.OK else None))
+    __elapsed = default_timer() - start
+    print("%-8s %8.3f s %10.0f frames/s %8.3f us/frame" % (
+        'single', __elapsed, args.frames / __elapsed,
+        __elapsed / args.frames * 1e6))
+
+    start = default_timer()
+    batch = batch_decode.decode(frames, kinds)
+    __elapsed = default_timer() - start
+    print("%-8s %8.3f s %10.0f frames/s %8.3f us/frame" % (
+        'batch', __elapsed, args.frames / __elapsed,
+        __elapsed / args.frames * 1e6))
+
+    for i, (__battery, __value) in enumerate(single):
+        assert batch['battery'][i] == __battery
+        if __value is None:
+            assert batch['error'][i] and math.isnan(batch['value'][i])
+        else:
+            assert batch['value'][i] == __value
+
+
+if __name__ == '__main__':
+    main()
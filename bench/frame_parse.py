@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+    Микробенчмарк разбора кадров радиоканала.
+
+    Сравнивает исходный разбор (индексы и сдвиги по bytearray, как в
+    convert_data/convert_battery до rpi.frame) с разбором
+    прекомпилированными struct.Struct из rpi.frame на синтетических
+    кадрах датчиков температуры (16 бит данных) и счетчиков импульсов
+    (32 бита). Оба варианта извлекают отправителя, номер, заряд батареи
+    и показания.
+
+    Запуск из корня репозитория:
+        python -m bench.frame_parse --frames 1000000
+"""
+import argparse
+import random
+from timeit import default_timer
+
+from rpi.frame import parse_header, payload_uint16, payload_uint32
+
+
+def legacy_temperature(packet):
+    """
+        Исходный разбор: отправитель, номер, заряд, 12 бит показаний.
+        Проверки длины - как в исходных read и convert_battery
+    """
+    if len(packet) <= 1:
+        return None
+    __value = (packet[5] | packet[6] << 8) & 0xFFF
+    if len(packet) >= 5:
+        __battery = packet[4] + 150
+    return packet[1], packet[3], __battery, __value
+
+
+def legacy_pulse(packet):
+    """ Исходный разбор: отправитель, номер, заряд, 32 бита импульсов """
+    if len(packet) <= 1:
+        return None
+    __pulses = 0
+    for i in range(4):
+        __pulses = __pulses | packet[5 + i] << (8 * i)
+    if len(packet) >= 5:
+        __battery = packet[4] + 150
+    return packet[1], packet[3], __battery, __pulses
+
+
+def struct_temperature(packet):
+    """ Разбор rpi.frame: заголовок и данные - по вызову struct """
+    __dst, __src, __type, __seq, __battery = parse_header(packet)
+    return __src, __seq, __battery + 150, payload_uint16(packet)[0] & 0xFFF
+
+
+def struct_pulse(packet):
+    __dst, __src, __type, __seq, __battery = parse_header(packet)
+    return __src, __seq, __battery + 150, payload_uint32(packet)[0]
+
+
+def make_frames(count):
+    """ Кадры [dst, src, type, seq, bat, d0, d1, d2, d3] """
+    return [bytearray([0, 1 + i % 255, 0, i & 0xFF, 170] +
+                      [random.randrange(256) for _ in range(4)])
+            for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=1000000)
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames)
+    for kind, variants in (
+            ('temperature', (('legacy', legacy_temperature),
+                             ('struct', struct_temperature))),
+            ('pulse', (('legacy', legacy_pulse),
+                       ('struct', struct_pulse)))):
+        results = {}
+        for name, decode in variants:
+            start = default_timer()
+            results[name] = [decode(packet) for packet in frames]
+            __elapsed = default_timer() - start
+            print("%-12s %-8s %8.3f s %10.0f frames/s %8.3f us/frame" % (
+                kind, name, __elapsed, args.frames / __elapsed,
+                __elapsed / args.frames * 1e6))
+        assert results['legacy'] == results['struct']
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+    Микробенчмарк поиска узла по принятому кадру.
+
+    Сравнивает исходный линейный поиск по спискам датчиков и устройств
+    хаба с поиском по индексам NodeIndex на большом числе узлов.
+    Кадры приходят от случайных узлов, часть - от неизвестных.
+
+    Запуск из корня репозитория:
+        python -m bench.node_dispatch --nodes 10000 --frames 20000
+"""
+import argparse
+import random
+from timeit import default_timer
+
+from rpi.devices import Relay
+from rpi.node_index import NodeIndex
+from rpi.sencors import TemperatureSencor
+
+
+def linear_lookup(snc_list, dvc_list, node_id):
+    """ Исходный поиск rpiHub.read: датчик, затем устройство """
+    for s in snc_list:
+        if s.sencor_id == node_id:
+            return s
+    for d in dvc_list:
+        if d.device_id == node_id:
+            return d
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', type=int, default=10000)
+    parser.add_argument('--frames', type=int, default=20000)
+    args = parser.parse_args()
+
+    # Половина узлов - датчики, половина - устройства
+    snc_list = [TemperatureSencor(i, 'bench', 'snc%s' % i)
+                for i in range(0, args.nodes, 2)]
+    dvc_list = [Relay(i, 'bench', 'dvc%s' % i, 'ch0', 'ch1', 0)
+                for i in range(1, args.nodes, 2)]
+    index = NodeIndex()
+    for s in snc_list:
+        index.add_sencor(s)
+    for d in dvc_list:
+        index.add_device(d)
+
+    # 5% кадров от неизвестных узлов - худший случай линейного поиска
+    frames = [random.randrange(int(args.nodes * 1.05))
+              for _ in range(args.frames)]
+
+    start = default_timer()
+    linear = [linear_lookup(snc_list, dvc_list, n) for n in frames]
+    linear_time = default_timer() - start
+
+    start = default_timer()
+    indexed = [index.lookup(n) for n in frames]
+    indexed_time = default_timer() - start
+
+    assert linear == indexed
+    print("nodes %d, frames %d" % (args.nodes, args.frames))
+    print("%-8s %12s %10s" % ('lookup', 'us/frame', 'frames/s'))
+    for name, elapsed in (('linear', linear_time), ('indexed', indexed_time)):
+        print("%-8s %12.2f %10.0f" % (name, elapsed / args.frames * 1e6,
+                                      args.frames / elapsed))
+    print("speedup  %.0fx" % (linear_time / indexed_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+    Бенчмарк памяти, занимаемой датчиками и устройствами хаба.
+
+    Строит узлы всех зарегистрированных типов (поровну) и измеряет
+    tracemalloc'ом память, выделенную под них. Для сравнения те же
+    атрибуты копируются в объекты с __dict__ - так узлы хранились до
+    перехода на __slots__ (тип, таймаут и таблицы кодов кондиционера были
+    атрибутами экземпляра). Значения атрибутов в обоих вариантах общие,
+    поэтому разница - только накладные расходы на хранение.
+
+    Запуск из корня репозитория:
+        python -m bench.node_memory --nodes 10000
+"""
+import argparse
+import tracemalloc
+
+from rpi.devices import DEVICE_TYPES
+from rpi.sencors import SENCOR_TYPES
+
+
+class DictNode(object):
+    """ Узел с атрибутами в __dict__ """
+    pass
+
+
+def node_slots(node):
+    """ Имена всех слотов узла по иерархии классов """
+    return [__slot for __cls in type(node).__mro__
+            for __slot in getattr(__cls, '__slots__', ())]
+
+
+def make_nodes(count):
+    """ Узлы всех типов по кругу с уникальными именами """
+    __types = list(SENCOR_TYPES.values()) + list(DEVICE_TYPES.values())
+    __nodes = []
+    for i in range(count):
+        __cls = __types[i % len(__types)]
+        __name = 'node%s' % i
+        if __cls in DEVICE_TYPES.values():
+            __nodes.append(__cls.from_settings(i, 'bench', __name,
+                                               'ch0', 'ch1', 0))
+        else:
+            __nodes.append(__cls(i, 'bench', __name))
+    return __nodes
+
+
+def copy_slotted(node):
+    """ Копия узла того же класса (__slots__) """
+    __copy = type(node).__new__(type(node))
+    for __slot in node_slots(node):
+        setattr(__copy, __slot, getattr(node, __slot))
+    return __copy
+
+
+def copy_dict(node):
+    """ Копия узла с __dict__, как до __slots__ """
+    __copy = DictNode()
+    for __slot in node_slots(node):
+        setattr(__copy, __slot, getattr(node, __slot))
+    __copy.type = node.type
+    if hasattr(node, 'timeout'):
+        __copy.timeout = node.timeout
+    if hasattr(node, 'mode_codes'):
+        __copy.mode_codes = node.mode_codes
+        __copy.angle_codes = node.angle_codes
+    return __copy
+
+
+def measure(build):
+    """ Память (байт), выделенная build() и удерживаемая результатом """
+    tracemalloc.start()
+    __result = build()
+    __size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return __size, __result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', type=int, default=10000)
+    args = parser.parse_args()
+
+    nodes = make_nodes(args.nodes)
+    __built, _ = measure(lambda: make_nodes(args.nodes))
+    print("%-10s %10d bytes %8.1f bytes/node" % (
+        'built', __built, __built / float(args.nodes)))
+    for name, copy in (('dict', copy_dict), ('slots', copy_slotted)):
+        __size, _ = measure(lambda: [copy(node) for node in nodes])
+        print("%-10s %10d bytes %8.1f bytes/node" % (
+            name, __size, __size / float(args.nodes)))
+
+
+if __name__ == '__main__':
+    main()
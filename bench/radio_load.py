@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+    Нагрузочный тест радиотракта без Raspberry Pi.
+
+    Симулятор RFM69 принимает кадры от N датчиков с заданной суммарной
+    частотой, драйвер работает без изменений, а потребитель разбирает
+    кадры так же, как это делает хаб. На выходе - пропускная способность,
+    потери и задержки.
+
+    Запуск из корня репозитория:
+        python -m bench.radio_load --nodes 500 --rate 300 --duration 10
+"""
+import argparse
+import threading
+from time import sleep
+
+from rpi.rfm69_lib.rfm69 import RFM69
+from rpi.rfm69_lib.configuration import RFM69Configuration
+from rpi.rfm69_lib.simulator import SimulatedBackend, TrafficGenerator
+from rpi.frame import parse_header, SRC
+from rpi.sencors import TemperatureSencor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=300)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    backend = SimulatedBackend()
+    radio = RFM69(dio0_pin=24, reset_pin=22, spi_channel=0,
+                  config=RFM69Configuration(chan_num=2), backend=backend)
+
+    # Радиоидентификаторы занимают один байт
+    node_ids = [1 + i % 255 for i in range(args.nodes)]
+    sencors = dict((n, TemperatureSencor(n, 'bench', 'snc%s' % n))
+                   for n in node_ids)
+
+    generator = TrafficGenerator(backend, node_ids, args.rate)
+    running = [True]
+
+    def consume():
+        while running[0]:
+            frame = radio.get_frame(timeout=0.5)
+            if frame is None:
+                continue
+            payload = frame[0]
+            sencor = sencors.get(parse_header(payload)[SRC])
+            if sencor is not None:
+                sencor.convert_data(payload)
+                sencor.convert_battery(payload)
+            generator.received(payload)
+
+    consumer = threading.Thread(target=consume)
+    radio.start_receiving()
+    consumer.start()
+    generator.start()
+    sleep(args.duration)
+    generator.stop()
+    sleep(0.5)
+    running[0] = False
+    consumer.join()
+    radio.stop_receiving()
+
+    report = generator.report(args.duration)
+    report['ring_overflows'] = radio.rx_overflows
+    report['spi_transactions'] = backend.transactions
+    for key in sorted(report):
+        print("%-18s %s" % (key, report[key]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+    Микробенчмарк упаковки/распаковки регистров RFM69.
+
+    Сравнивает исходную универсальную реализацию (цикл по FORMAT через
+    getattr/setattr/type) со сгенерированными при создании класса
+    функциями RegisterValue.
+
+    Запуск из корня репозитория:
+        python -m bench.register_unpack
+"""
+from timeit import timeit
+
+from rpi.rfm69_lib.configuration import IRQFlags1, IRQFlags2, OpMode
+
+
+def generic_unpack(cls, value):
+    """ Исходная реализация RegisterValue.unpack """
+    reg = cls()
+    pos = 8
+    for field, length in reg.FORMAT:
+        pos -= length
+        bits = (value >> pos) & (2**length - 1)
+        if isinstance(field, str):
+            setattr(reg, field, type(getattr(reg, field))(bits))
+    return reg
+
+
+def generic_pack(reg):
+    """ Исходная реализация RegisterValue.pack """
+    result = 0
+    pos = 8
+    for field, length in reg.FORMAT:
+        pos -= length
+        if isinstance(field, str):
+            val = getattr(reg, field)
+        else:
+            val = field
+        result |= int(val) << pos
+    return result
+
+
+def main():
+    number = 200000
+    print("%-10s %-7s %12s %12s %8s" % ("register", "op", "generic, us", "compiled, us", "speedup"))
+    for cls in (IRQFlags1, IRQFlags2, OpMode):
+        # Сгенерированный код должен давать тот же результат
+        for value in range(256):
+            fast = cls.unpack(value)
+            slow = generic_unpack(cls, value)
+            assert fast.pack() == generic_pack(slow)
+
+        reg = cls.unpack(0xA5)
+        cases = (
+            ('unpack', lambda: generic_unpack(cls, 0xA5), lambda: cls.unpack(0xA5)),
+            ('pack', lambda: generic_pack(reg), reg.pack),
+        )
+        for op, slow, fast in cases:
+            t_slow = timeit(slow, number=number) / number * 1e6
+            t_fast = timeit(fast, number=number) / number * 1e6
+            print("%-10s %-7s %12.3f %12.3f %7.1fx" % (cls.__name__, op, t_slow, t_fast,
+                                                      t_slow / t_fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+    Воспроизведение записи радиоканала через обработчик кадров хаба.
+
+    Кадры из файла записи (см. rpi.rfm69_lib.capture, настройка 'capture'
+    в rpiHub.RADIOS) подаются в rpiHub.dispatch_frame так же, как их
+    подает планировщик радиоканала. Радиомодуль заменен симулятором,
+    остальное (БД, Firebase) - как на хабе.
+
+    Запуск из корня репозитория:
+        python -m bench.replay_capture rfm-0.cap --speed 0
+"""
+import argparse
+
+from rpi.rfm69_lib.capture import replay
+from rpi.rfm69_lib.simulator import SimulatedBackend
+from rpi.rpi import rpiHub
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('capture')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="1 - реальное время, 0 - максимально быстро")
+    args = parser.parse_args()
+
+    hub = rpiHub(radio_backend=SimulatedBackend())
+    try:
+        report = replay(args.capture, hub.dispatch_frame, speed=args.speed)
+    finally:
+        hub.stop()
+
+    for key in sorted(report):
+        print("%-10s %s" % (key, report[key]))
+    print("%-10s %s" % ("duplicates", hub.sequences.duplicates))
+    print("%-10s %s" % ("lost", hub.sequences.lost))
+
+
+if __name__ == '__main__':
+    main()
@@ -234,6 +234,49 @@ def device():
     return jsonify(response)
 
 
+@app.route('/links', methods=['GET'])
+@cross_origin()
+def get_links():
+    """ Получение показателей качества радиоканала по узлам """
+    LOG.info("Got links")
+    response = rpiHub.get_link_stats()
+    return jsonify(response)
+
+
+@app.route('/tasks', methods=['GET'])
+@cross_origin()
+def get_tasks():
+    """ Получение статистики служебных задач хаба и радиоканала """
+    LOG.info("Got tasks")
+    response = rpiHub.get_task_stats()
+    return jsonify(response)
+
+
+@app.route('/radios', methods=['GET'])
+@cross_origin()
+def get_radios():
+    """ Получение статистики радиомодулей и привязки узлов к ним """
+    LOG.info("Got radios")
+    response = rpiHub.get_radio_stats()
+    return jsonify(response)
+
+
+@app.route('/radios', methods=['PUT'])
+@cross_origin()
+def assign_radio():
+    """ Закрепление узла за радиомодулем """
+    LOG.info("Got radio assignment")
+    if not request.json:
+        abort(400)
+    elif 'node_id' not in request.json or 'radio' not in request.json:
+        abort(400)
+
+    config = request.get_json()
+    response = rpiHub.assign_radio(int(config['node_id']),
+                                   int(config['radio']))
+    return jsonify(response)
+
+
 @app.route('/firebase', methods=['POST', 'PUT'])
 @cross_origin()
 def firebase_creds():
@@ -0,0 +1,133 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+"""
+    Пакетный разбор кадров датчиков средствами NumPy.
+
+    Для повторного воспроизведения записей радиоканала, дозаполнения
+    истории и анализа захваченного трафика: массив кадров разбирается за
+    один проход и возвращается по столбцам. Константы и таблица заряда
+    батареи - те же, что у разбора по одному кадру в rpi.sencors.
+"""
+import numpy as np
+
+from .frame import HEADER
+from .sencors import (BATTERY_TABLE, ERROR_CODE, TEMPERATURE_MASK,
+                      TEMPERATURE_SCALE, PULSES_PER_KWH, LITRES_PER_PULSE)
+
+# Типы датчиков, разбираемые пакетно
+KINDS = ('Temperature', 'Luminosity', 'Door', 'Pulse', 'Water')
+# Код неизвестного (неразбираемого) типа
+UNKNOWN = -1
+
+# Ширина строки кадра: заголовок и 4 байта данных
+WIDTH = HEADER.size + 4
+
+_BATTERY = np.array(BATTERY_TABLE, dtype=np.uint8)
+_KIND_CODES = dict((__name, __code) for __code, __name in enumerate(KINDS))
+
+
+def _rows(packets):
+    """
+        Матрица N x WIDTH байт кадров (короткие дополнены нулями,
+        длинные усечены) и длины исходных пакетов
+    """
+    __lengths = np.fromiter((len(__p) for __p in packets), dtype=np.intp,
+                            count=len(packets))
+    if len(packets) and (__lengths == WIDTH).all():
+        # Все кадры одной длины: одна склейка без копирования по строкам
+        __raw = b''.join(packets)
+    else:
+        __raw = b''.join(bytes(__p[:WIDTH]).ljust(WIDTH, b'\0')
+                         for __p in packets)
+    __rows = np.frombuffer(__raw, dtype=np.uint8).reshape(-1, WIDTH)
+    return __rows, __lengths
+
+
+def _kind_codes(kinds, src):
+    """
+        Коды типов датчиков по кадрам
+        @param: kinds - имя типа для всех кадров, словарь
+                {отправитель: имя типа} или последовательность имен
+    """
+    if isinstance(kinds, str):
+        return np.full(len(src), _KIND_CODES.get(kinds, UNKNOWN),
+                       dtype=np.int8)
+    if isinstance(kinds, dict):
+        # Таблица отправитель -> код, индексируемая столбцом src
+        __table = np.full(256, UNKNOWN, dtype=np.int8)
+        for __src, __name in kinds.items():
+            __table[__src] = _KIND_CODES.get(__name, UNKNOWN)
+        return __table[src]
+    return np.fromiter((_KIND_CODES.get(__name, UNKNOWN) for __name in kinds),
+                       dtype=np.int8, count=len(src))
+
+
+def decode(packets, kinds):
+    """
+        Разобрать кадры датчиков за один проход
+        @param: packets - последовательность пакетов (bytes/bytearray)
+        @param: kinds - тип датчика: имя для всех кадров, словарь
+                {отправитель: имя типа} или имя для каждого кадра
+        @return: словарь столбцов одинаковой длины:
+                src, seq - отправитель и порядковый номер;
+                kind - код типа (индекс в KINDS, UNKNOWN - не разбирался);
+                battery - заряд батареи, %;
+                value - показания (°C, люкс, 0/1 открытия двери, КВт*ч,
+                        литры), NaN при ошибке;
+                error - код ошибки датчика, кадр короче данных типа
+                        или тип не разбирается
+    """
+    __rows, __lengths = _rows(packets)
+    __src = __rows[:, 1]
+    __kind = _kind_codes(kinds, __src)
+
+    # Полезные данные как little-endian целые без копирования
+    __payload = np.ascontiguousarray(__rows[:, HEADER.size:])
+    __u32 = __payload.view('<u4')[:, 0]
+    __u16 = (__u32 & 0xFFFF).astype(np.uint16)
+    __data_len = __lengths - HEADER.size
+
+    __value = np.full(len(__rows), np.nan)
+    __error = np.ones(len(__rows), dtype=bool)
+
+    # Датчики температуры: 12 бит в десятых долях градуса
+    __mask = (__kind == _KIND_CODES['Temperature']) & (__data_len >= 2)
+    __temp = __u16 & TEMPERATURE_MASK
+    __ok = __mask & (__temp != ERROR_CODE)
+    __value[__ok] = __temp[__ok] / TEMPERATURE_SCALE
+    __error[__ok] = False
+
+    # Датчики освещенности: 16 бит
+    __mask = (__kind == _KIND_CODES['Luminosity']) & (__data_len >= 2)
+    __ok = __mask & (__u16 != ERROR_CODE)
+    __value[__ok] = __u16[__ok]
+    __error[__ok] = False
+
+    # Датчики открытия двери: третий байт данных
+    __mask = (__kind == _KIND_CODES['Door']) & (__data_len >= 3)
+    __door = __payload[:, 2]
+    __ok = __mask & (__door != ERROR_CODE)
+    __value[__ok] = __door[__ok] != 0
+    __error[__ok] = False
+
+    # Счетчики электроэнергии и воды: 32 бита импульсов
+    __mask = (__kind == _KIND_CODES['Pulse']) & (__data_len >= 4)
+    __value[__mask] = __u32[__mask] / PULSES_PER_KWH
+    __error[__mask] = False
+    __mask = (__kind == _KIND_CODES['Water']) & (__data_len >= 4)
+    __value[__mask] = __u32[__mask].astype(np.float64) * LITRES_PER_PULSE
+    __error[__mask] = False
+
+    # Кадры короче заголовка не разбираются вовсе
+    __short = __lengths < HEADER.size
+    __kind = np.where(__short, UNKNOWN, __kind).astype(np.int8)
+
+    return {
+        'src': __src,
+        'seq': __rows[:, 3],
+        'kind': __kind,
+        'battery': _BATTERY[__rows[:, 4]],
+        'value': __value,
+        'error': __error,
+    }
@@ -0,0 +1,133 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+
+import threading
+from collections import deque
+from math import ceil, sqrt
+
+
+class BeaconPredictor(object):
+    """
+        Предсказание окон приема устройства с маяком (контроллер
+        кондиционера) по наблюдаемым временам прихода маяков.
+
+        Маяк приходит раз в period секунд по часам устройства, которые
+        уходят относительно часов хаба. Номер маяка и время прихода
+        связаны линейно: t = t0 + n * period', где t0 и реальный период
+        period' оцениваются методом наименьших квадратов по последним
+        history маякам (пропущенные маяки не мешают: номер определяется
+        по текущей оценке). Окна приема открываются windows раз за период,
+        окно маяка - с задержкой gap.
+
+        Разброс остатков дает доверительный интервал предсказания.
+
+        Маяки учитываются в потоке радиоканала, а предсказание
+        запрашивается из потока команд, поэтому оценки защищены lock.
+    """
+    def __init__(self, period=10.0, windows=2, gap=0.05, history=16, z=3,
+                 min_sigma=0.002):
+        """
+            @param: period - номинальный период маяков, сек
+            @param: windows - число окон приема за период
+            @param: gap - задержка передачи в окне маяка, сек
+            @param: history - число маяков для оценки
+            @param: z - ширина доверительного интервала в СКО
+            @param: min_sigma - нижняя граница СКО (точность отметок
+                    времени), сек
+        """
+        self.nominal = period
+        self.windows = windows
+        self.gap = gap
+        self.z = z
+        self.min_sigma = min_sigma
+        self.lock = threading.Lock()
+        # Пары (номер маяка, время прихода относительно первого)
+        self.arrivals = deque(maxlen=history)
+        self.ref = None
+        # Оценки: время нулевого маяка, период, СКО остатков
+        self.t0 = 0.0
+        self.period = period
+        self.sigma = None
+        self.last = None
+        # Среднее и разброс номеров маяков (для интервала предсказания)
+        self.xbar = 0.0
+        self.sxx = 0.0
+
+    @property
+    def ready(self):
+        """ Достаточно ли наблюдений для предсказания """
+        return len(self.arrivals) >= 3
+
+    def observe(self, t):
+        """ Учесть маяк, принятый в момент t """
+        with self.lock:
+            if self.ref is None:
+                self.ref = t
+            # Номер маяка по текущей оценке
+            __n = int(round((t - self.ref - self.t0) / self.period))
+            if self.arrivals and __n <= self.arrivals[-1][0]:
+                # Повтор маяка или кадр не из окна маяка
+                return
+            self.arrivals.append((__n, t - self.ref))
+            self.last = t
+            self._fit()
+
+    def _fit(self):
+        """ Оценка t0 и периода методом наименьших квадратов """
+        __count = len(self.arrivals)
+        if __count < 2:
+            self.t0 = self.arrivals[0][1] - self.arrivals[0][0] * self.period
+            return
+        __xbar = sum(n for n, _ in self.arrivals) / float(__count)
+        __ybar = sum(y for _, y in self.arrivals) / __count
+        __sxx = sum((n - __xbar) ** 2 for n, _ in self.arrivals)
+        __sxy = sum((n - __xbar) * (y - __ybar) for n, y in self.arrivals)
+        self.period = __sxy / __sxx
+        self.t0 = __ybar - self.period * __xbar
+        self.xbar = __xbar
+        self.sxx = __sxx
+        if __count > 2:
+            __ssr = sum((y - self.t0 - self.period * n) ** 2
+                        for n, y in self.arrivals)
+            self.sigma = max(self.min_sigma, sqrt(__ssr / (__count - 2)))
+
+    def predict(self, now):
+        """
+            Ближайшее окно приема не раньше now
+            @return: (время передачи, нижняя граница, верхняя граница)
+                     или None, если наблюдений недостаточно
+        """
+        with self.lock:
+            if not self.ready:
+                return None
+            __step = self.period / self.windows
+            __m = int(ceil((now - self.ref - self.t0 - self.gap) / __step))
+            while True:
+                __x = __m / float(self.windows)
+                __center = self.ref + self.t0 + self.period * __x
+                if __m % self.windows == 0:
+                    __center += self.gap
+                if __center >= now:
+                    break
+                __m += 1
+            # Интервал предсказания линейной регрессии
+            __count = len(self.arrivals)
+            __se = self.sigma * sqrt(1 + 1.0 / __count +
+                                     (__x - self.xbar) ** 2 / self.sxx)
+        return (__center, __center - self.z * __se, __center + self.z * __se)
+
+    def expected_latency(self, now):
+        """ Ожидаемое время до ближайшего окна приема, сек, или None """
+        __window = self.predict(now)
+        return __window[0] - now if __window is not None else None
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                'samples': len(self.arrivals),
+                'period': self.period,
+                'drift_ppm': (self.period - self.nominal) / self.nominal * 1e6,
+                'sigma': self.sigma,
+                'last': self.last,
+            }
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+
+import heapq
+import itertools
+import threading
+from time import time
+
+from .rfm69_lib.stats import Histogram
+
+
+class CommandQueue(object):
+    """
+        Потокобезопасная очередь управляющих команд с приоритетами.
+
+        Для каждого устройства в очереди хранится не больше одной команды:
+        команда содержит полное состояние устройства, поэтому новая команда
+        заменяет ожидающую (побеждает последнее состояние) и сохраняет ее
+        место в очереди. Команды одного устройства уходят в порядке
+        поступления, между устройствами - по приоритету (меньше - раньше),
+        затем по времени постановки.
+
+        Команда, не отправленная до крайнего срока, выбрасывается, и для
+        нее вызывается on_expire(cmd, device).
+    """
+    def __init__(self, on_expire=None):
+        self.on_expire = on_expire
+        self.lock = threading.Lock()
+        # Куча записей [приоритет, порядковый номер, запись]
+        self.heap = []
+        # Идентификатор устройства -> ожидающая запись
+        self.pending = {}
+        self.counter = itertools.count()
+
+        # Время ожидания команды в очереди
+        self.wait = Histogram()
+        self.enqueued = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def put(self, cmd, device, priority=0, deadline=None):
+        """
+            Поставить команду в очередь
+            @param: cmd - команда
+            @param: device - экземпляр устройства-адресата
+            @param: priority - приоритет (меньше - раньше)
+            @param: deadline - время жизни команды, сек (None - без срока)
+            @return: True, если команда заменила ожидающую
+        """
+        __now = time()
+        __expires = __now + deadline if deadline is not None else None
+        with self.lock:
+            self.enqueued += 1
+            __entry = self.pending.get(device.device_id)
+            if __entry is not None:
+                # Заменить устаревшую команду, сохранив место в очереди
+                __entry['cmd'] = cmd
+                __entry['device'] = device
+                __entry['expires'] = __expires
+                self.coalesced += 1
+                return True
+            __entry = {
+                'cmd': cmd,
+                'device': device,
+                'since': __now,
+                'expires': __expires,
+            }
+            self.pending[device.device_id] = __entry
+            heapq.heappush(self.heap,
+                           [priority, next(self.counter), __entry])
+            self.max_depth = max(self.max_depth, len(self.pending))
+            return False
+
+    def get(self):
+        """
+            Изъять следующую команду
+            @return: (cmd, device) или None, если очередь пуста
+        """
+        __expired = []
+        __result = None
+        with self.lock:
+            __now = time()
+            while self.heap:
+                __entry = heapq.heappop(self.heap)[2]
+                if __entry.get('removed'):
+                    continue
+                del self.pending[__entry['device'].device_id]
+                if __entry['expires'] is not None and \
+                        __entry['expires'] < __now:
+                    self.expired += 1
+                    __expired.append(__entry)
+                    continue
+                self.wait.add(__now - __entry['since'])
+                __result = (__entry['cmd'], __entry['device'])
+                break
+        # Обработчик вызывается вне блокировки: он может ставить команды
+        if self.on_expire is not None:
+            for __entry in __expired:
+                self.on_expire(__entry['cmd'], __entry['device'])
+        return __result
+
+    def remove(self, device_id):
+        """ Выбросить ожидающую команду устройства (устройство удалено) """
+        with self.lock:
+            __entry = self.pending.pop(device_id, None)
+            if __entry is not None:
+                # Запись остается в куче и пропускается при изъятии
+                __entry['removed'] = True
+
+    def get_stats(self):
+        """ Статистика очереди команд """
+        with self.lock:
+            __stats = {
+                'depth': len(self.pending),
+                'max_depth': self.max_depth,
+                'enqueued': self.enqueued,
+                'coalesced': self.coalesced,
+                'expired': self.expired,
+            }
+        __stats['wait'] = self.wait.as_dict()
+        return __stats
@@ -0,0 +1,201 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+
+import threading
+from math import ceil
+from time import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class ConditionerDelivery(object):
+    """
+        Доставка команды контроллеру кондиционера без блокировки.
+
+        Контроллер принимает команды только в коротком окне после своего
+        маяка. Вместо ожидания окна в цикле доставка - конечный автомат:
+        каждый шаг ставит в планировщик радиоканала ожидание маяка или
+        отложенную передачу и возвращает управление, а step() продвигает
+        автомат после завершения Future. Так одновременно доставляются
+        команды нескольким контроллерам, а радиоканал и очередь команд
+        обслуживают остальные устройства.
+
+        Состояния:
+            BEACON - "неукрощенный" контроллер: ждать маяк, затем передать
+                     команду через BEACON_GAP после него. Передачу после
+                     маяка планирует сам поток радиоканала
+                     (expect_then_send), окно не зависит от step()
+            SEND - команда ждет передачи в окне приема и ответа на нее.
+                   Для "укрощенного" контроллера окно рассчитывается
+                   от времени последнего ответа
+    """
+    BEACON = 'BEACON'
+    SEND = 'SEND'
+
+    # Время на доставку "неукрощенному" контроллеру, сек
+    UNTAMED_TIMEOUT = 40
+    # Время на доставку "укрощенному" контроллеру, сек
+    TAMED_TIMEOUT = 26
+    # Период окон приема "укрощенного" контроллера, сек
+    SLOT_PERIOD = 5
+    # Задержка передачи после маяка (и в окне маяка каждые 10 сек), сек
+    BEACON_GAP = 0.05
+    # Время ожидания ответа на команду, сек
+    ACK_TIMEOUT = 1
+
+    def __init__(self, radio, device, cmd, wakeup=None, predictor=None):
+        """
+            @param: radio - RadioScheduler
+            @param: device - экземпляр Conditioner
+            @param: cmd - команда
+            @param: wakeup - функция, вызываемая (из потока радиоканала)
+                    при завершении очередного шага; должна привести к
+                    вызову step()
+            @param: predictor - BeaconPredictor контроллера; пока он не
+                    готов, окна считаются от last_response
+        """
+        self.radio = radio
+        self.device = device
+        # step() и cancel() вызываются из разных потоков
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.wakeup = wakeup
+        self.predictor = predictor
+        self.state = None
+        self.future = None
+        # Переданная команда и номер байта для проверки ответа
+        self.sent_cmd = None
+        self.check_byte = None
+        self._update(cmd)
+
+    def update(self, cmd):
+        """ Заменить команду более новой (побеждает последнее состояние) """
+        with self.lock:
+            self._update(cmd)
+
+    def _update(self, cmd):
+        self.cmd = cmd
+        self.started = time()
+        __timeout = self.TAMED_TIMEOUT if self.device.is_tamed \
+            else self.UNTAMED_TIMEOUT
+        self.deadline = self.started + __timeout
+        # Отложенная, но еще не переданная команда устарела
+        if self.state == self.SEND and self.future is not None and \
+                self.future.cancel():
+            self.future = None
+
+    def from_device(self, frame):
+        """ Условие: кадр пришел от контроллера """
+        return len(frame[0]) > 1 and frame[0][1] == self.device.device_id
+
+    def cancel(self):
+        """ Прекратить доставку (устройство удалено) """
+        with self.lock:
+            self.cancelled = True
+            if self.future is not None:
+                self.radio.cancel(self.future)
+                self.future = None
+
+    def step(self):
+        """
+            Продвинуть автомат
+            @return: None - доставка продолжается, True - команда принята,
+                     False - время на доставку истекло или доставка отменена
+        """
+        with self.lock:
+            if self.cancelled:
+                return False
+            return self._step()
+
+    def _step(self):
+        """ Шаг автомата (под блокировкой) """
+        if self.future is None:
+            return self._next()
+        if not self.future.done():
+            return None
+        try:
+            __frame = self.future.result()
+        except Exception as e:
+            log.error("Conditioner %s: %s" % (self.device.name, e))
+            __frame = None
+        __future, self.future = self.future, None
+
+        if self.state == self.BEACON:
+            if __future.beacon_at is None:
+                # Маяк не пришел за отведенное время
+                return False
+            log.info("GOTCHA")
+            # beacon_at - время приема маяка радиомодулем
+            if self.predictor is not None:
+                self.predictor.observe(__future.beacon_at)
+
+        if __frame is not None:
+            __status = self.device.check_response(
+                self.sent_cmd[self.check_byte], __frame[0])
+            if __status and self.sent_cmd is self.cmd:
+                if not self.device.is_tamed:
+                    # Ответ на команду после маяка: контроллер "укрощен"
+                    self.device.is_tamed = True
+                    log.info("CONDER %s: SENT AND TAMED" % self.device.name)
+                return True
+        return self._next()
+
+    def _next(self):
+        """ Следующая попытка или завершение по времени """
+        __now = time()
+        if __now >= self.deadline:
+            return False
+        if not self.device.is_tamed:
+            self.state = self.BEACON
+            self.check_byte = 4
+            self.future = self.radio.expect_then_send(
+                self.from_device, timeout=self.deadline - __now,
+                data=self._beacon_cmd, gap=self.BEACON_GAP,
+                ack=self.from_device, ack_timeout=self.ACK_TIMEOUT)
+            self._watch()
+        else:
+            __slot = self.next_window(__now)
+            if __slot >= self.deadline:
+                return False
+            self._send(__slot, check_byte=3)
+        return None
+
+    def next_window(self, now):
+        """ Время передачи в ближайшее окно приема контроллера """
+        if self.predictor is not None:
+            __window = self.predictor.predict(now)
+            if __window is not None:
+                return __window[0]
+        return self.next_slot(self.device.last_response, now)
+
+    def next_slot(self, last_response, now):
+        """
+            Ближайшее окно приема "укрощенного" контроллера: каждые
+            SLOT_PERIOD сек от последнего ответа, в окне маяка (каждые
+            10 сек) - с задержкой BEACON_GAP
+        """
+        __n = max(0, int(ceil((now - last_response) / self.SLOT_PERIOD)))
+        __slot = last_response + __n * self.SLOT_PERIOD
+        if __n % 2 == 0:
+            __slot += self.BEACON_GAP
+        return __slot
+
+    def _send(self, at, check_byte):
+        """ Отложенная передача текущей команды """
+        self.sent_cmd = self.cmd
+        self.check_byte = check_byte
+        self.state = self.SEND
+        self.future = self.radio.submit(self.cmd, ack=self.from_device,
+                                        timeout=self.ACK_TIMEOUT, at=at)
+        self._watch()
+
+    def _beacon_cmd(self):
+        """ Текущая команда в момент передачи после маяка (поток радио) """
+        self.sent_cmd = self.cmd
+        return self.cmd
+
+    def _watch(self):
+        if self.wakeup is not None:
+            self.future.add_done_callback(lambda future: self.wakeup())
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+
+from collections import OrderedDict
+from time import time
+
+
+class SequenceTracker(object):
+    """
+        Подавление повторов кадров и учет пропусков по номерам.
+
+        Узлы повторяют кадры, и хаб может принять несколько копий. Кадр,
+        полностью совпадающий с принятым от того же узла за последние
+        window секунд, считается повтором. Недавние кадры хранятся в
+        ограниченном LRU на size записей по (отправитель, номер), пакет
+        сравнивается с запомненным только при совпадении ключа.
+
+        Номер кадра (байт seq) растет на 1 по модулю 256: разрыв меньше
+        половины круга - потерянные кадры, больший скачок назад - сброс
+        узла или перестановка, потерями не считается.
+    """
+    def __init__(self, window=30, size=4096):
+        self.window = window
+        self.size = size
+        # (отправитель, номер) -> (время первой копии, пакет)
+        self.recent = OrderedDict()
+        # Отправитель -> последний номер кадра
+        self.last_seq = {}
+        self.duplicates = 0
+        self.lost = 0
+
+    def check(self, src, seq, packet, now=None):
+        """
+            Проверить кадр
+            @param: src, seq - отправитель и номер из заголовка
+            @param: packet - пакет кадра (хранится без копирования)
+            @return: (повтор ли кадр, число потерянных перед ним кадров)
+        """
+        __now = time() if now is None else now
+        # Забыть кадры старше окна (словарь упорядочен по времени)
+        __horizon = __now - self.window
+        while self.recent and next(iter(self.recent.values()))[0] < __horizon:
+            self.recent.popitem(last=False)
+
+        __key = (src, seq)
+        __seen = self.recent.get(__key)
+        if __seen is not None:
+            if __seen[1] == packet:
+                self.duplicates += 1
+                return True, 0
+            # Тот же номер с другими данными (сброс узла) - новый кадр
+            del self.recent[__key]
+        self.recent[__key] = (__now, packet)
+        if len(self.recent) > self.size:
+            self.recent.popitem(last=False)
+
+        __lost = 0
+        __last = self.last_seq.get(src)
+        if __last is not None:
+            __delta = (seq - __last) & 0xFF
+            if 1 < __delta < 128:
+                __lost = __delta - 1
+        self.last_seq[src] = seq
+        self.lost += __lost
+        return False, __lost
+
+    def forget(self, node_id):
+        """ Забыть номер последнего кадра узла (при удалении узла) """
+        self.last_seq.pop(node_id, None)
+
+    def get_stats(self):
+        return {
+            'duplicates': self.duplicates,
+            'lost': self.lost,
+            'tracked': len(self.recent),
+        }
@@ -8,9 +8,41 @@ import logging
 
 log = logging.getLogger(__name__)
 
+# Реестр классов устройств: имя типа -> класс
+DEVICE_TYPES = {}
+# Реестр классов устройств по коду типа в радиокадре: кадры с этими
+# кодами хаб разбирает как кадры устройств, остальные - как кадры датчиков
+DEVICE_RADIO_TYPES = {}
+
+
+def register_device(type_name, radio_type=None):
+    """
+        Декоратор регистрации класса устройства в реестре типов.
+        Позволяет добавлять новые типы устройств без изменения хаба.
+        @param: type_name - имя типа (как в БД и REST API)
+        @param: radio_type - код типа в кадрах устройства
+    """
+    def decorator(cls):
+        DEVICE_TYPES[type_name] = cls
+        if radio_type is not None:
+            DEVICE_RADIO_TYPES[radio_type] = cls
+        return cls
+    return decorator
+
 
 class Device(object):
-    """ Родительский класс устройств """
+    """
+        Родительский класс устройств.
+
+        Экземпляры без __dict__ (__slots__), тип и таблицы кодов - атрибуты
+        класса; наследники объявляют собственные __slots__
+    """
+    __slots__ = ('device_id', 'group_name', 'name', 'cmd_num',
+                 'last_response')
+
+    # Тип устройства
+    type = None
+
     def __init__(self, dvc_id, group_name, name):
         # Идентификатор устройтсва
         self.device_id = dvc_id
@@ -35,14 +67,26 @@ class Device(object):
         }
         return response
 
+    @classmethod
+    def from_settings(cls, dvc_id, group_name, name, ch0name=None,
+                      ch1name=None, last_val=None):
+        """ Создать устройство по строке настроек из БД/REST API """
+        return cls(dvc_id=dvc_id, group_name=group_name, name=name,
+                   last_val=last_val)
+
 
+@register_device("Relay", radio_type=14)
 class Relay(Device):
     """ Класс реле """
+    __slots__ = ('ch0name', 'ch1name', 'ch0val', 'ch1val', 'ch0old',
+                 'ch1old')
+
+    # Тип устройства
+    type = 'Relay'
+
     def __init__(self, dvc_id, group_name, name, ch0name, ch1name, last_val):
         # Инициализация родительского класса
         super(Relay, self).__init__(dvc_id, group_name, name)
-        # Тип устройства
-        self.type = 'Relay'
 
         # Имя нулевого канала
         self.ch0name = ch0name
@@ -63,6 +107,13 @@ class Relay(Device):
         self.ch0old = self.ch0val
         self.ch1old = self.ch0val
 
+    @classmethod
+    def from_settings(cls, dvc_id, group_name, name, ch0name=None,
+                      ch1name=None, last_val=None):
+        """ Переопределение: реле хранит имена каналов """
+        return cls(dvc_id=dvc_id, group_name=group_name, name=name,
+                   ch0name=ch0name, ch1name=ch1name, last_val=last_val)
+
     def get_info(self):
         """ Переопределение мметода получения информации об устройстве """
         response = {
@@ -150,13 +201,22 @@ class Relay(Device):
         self.ch1val = self.ch1old
 
 
+@register_device("Conditioner", radio_type=17)
 class Conditioner(Device):
     """ Класс контроллера кондиционера"""
+    __slots__ = ('is_tamed', 'value', 'old_value', 'power', 'mode', 'temp',
+                 'speed', 'angle')
+
+    # Тип устройства
+    type = "Conditioner"
+    # Кодовые обозначения режимов работы
+    mode_codes = ("AUTO", "COOL", "DRY", "VENT", "HEAT")
+    # Кодовые обозначения углов диффузора
+    angle_codes = ("AUTO", "TOP", "HTOP", "HBOT", "BOT")
+
     def __init__(self, dvc_id, group_name, name, last_val):
         # Инициализация родительского класса
         super(Conditioner, self).__init__(dvc_id, group_name, name)
-        # Тип устройства
-        self.type = "Conditioner"
         # Флаг факта управления
         self.is_tamed = False
 
@@ -165,11 +225,6 @@ class Conditioner(Device):
         # Бэкап последнего успешного знчения управления
         self.old_value = self.value
 
-        # Кодовые обозначения режимов работы
-        self.mode_codes = ("AUTO", "COOL", "DRY", "VENT", "HEAT")
-        # Кодовые обозначения углов диффузора
-        self.angle_codes = ("AUTO", "TOP", "HTOP", "HBOT", "BOT")
-
         # Откат занчений параметров управления
         self.rollback()
 
@@ -195,6 +195,35 @@ class fireBase():
                 log.error("Error occured while updating device")
                 log.exception(e)
 
+    def update_batch(self, sencors=(), devices=()):
+        """
+            Обновить данные нескольких датчиков и устройств в облачной базе
+            данных одним запросом (multi-path update от корня пользователя)
+        """
+        if self.is_auth:
+            _data = {}
+            for sencor in sencors:
+                _dir = 'groups/%s/sencors/' % sencor.group_name
+                for key, value in sencor.form_data().items():
+                    _data[_dir + key] = value
+            for device in devices:
+                _dir = 'groups/%s/devices/' % device.group_name
+                for key, value in device.form_data().items():
+                    _data[_dir + key] = value
+            if not _data:
+                return
+            try:
+                # Обновить данные в облаке
+                self.root.update(_data, self.token)
+            except ConnErr as e:
+                # Ошибка подключения, потеря интернет соединения
+                self.is_auth = False
+                log.error("Internet connection is lost")
+                log.exception(e)
+            except Exception as e:
+                log.error("Error occured while updating sencors and devices")
+                log.exception(e)
+
     def delete_device(self, device):
         """ Удалить данные устройства из облачной базы данных """
         if self.is_auth:
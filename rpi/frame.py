@@ -0,0 +1,32 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+"""
+    Разбор кадров радиоканала прекомпилированными struct.Struct.
+
+    Кадр не оборачивается в объект: создание любого Python-объекта на
+    кадр дороже, чем разбор заголовка индексами. Заголовок разбирается
+    одним вызовом parse_header в кортеж, полезные данные датчика - одним
+    вызовом раскладки (PAYLOAD_*) прямо из исходного пакета, без копий.
+"""
+import struct
+
+# Заголовок кадра: адресат, отправитель, тип, номер, заряд батареи
+HEADER = struct.Struct('<BBBBB')
+# Индексы полей заголовка в пакете и в кортеже parse_header
+DST, SRC, TYPE, SEQ, BATTERY = range(HEADER.size)
+
+# Раскладки полезных данных (сразу за заголовком, little-endian).
+# unpack_from возвращает кортеж из одного числа
+PAYLOAD_UINT16 = struct.Struct('<%dxH' % HEADER.size)
+PAYLOAD_UINT32 = struct.Struct('<%dxI' % HEADER.size)
+payload_uint16 = PAYLOAD_UINT16.unpack_from
+payload_uint32 = PAYLOAD_UINT32.unpack_from
+
+# Кадр (пакет) короче раскладки - ошибка struct
+FrameError = struct.error
+
+# Разобрать заголовок кадра: (dst, src, type, seq, battery) - адресат,
+# отправитель, код типа, порядковый номер и сырое значение напряжения
+# батареи. Кадр короче заголовка - FrameError
+parse_header = HEADER.unpack_from
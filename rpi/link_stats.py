@@ -0,0 +1,130 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+
+import threading
+from time import time
+
+
+class LinkStats(object):
+    """ Показатели качества радиоканала одного узла """
+    __slots__ = ('packets', 'damaged', 'duplicates', 'lost', 'last_rssi',
+                 'avg_rssi', 'min_rssi', 'max_rssi', 'last_seen', 'interval',
+                 'jitter')
+
+    # Вес нового значения в скользящем среднем RSSI
+    RSSI_WEIGHT = 1 / 8.0
+    # Вес нового значения в оценке джиттера (как в RFC 3550)
+    JITTER_WEIGHT = 1 / 16.0
+
+    def __init__(self):
+        # Количество принятых кадров
+        self.packets = 0
+        # Количество поврежденных кадров
+        self.damaged = 0
+        # Количество повторов и потерянных кадров (по номерам)
+        self.duplicates = 0
+        self.lost = 0
+        # RSSI: последний, скользящее среднее, минимум и максимум
+        self.last_rssi = None
+        self.avg_rssi = None
+        self.min_rssi = None
+        self.max_rssi = None
+        # Время последнего кадра
+        self.last_seen = None
+        # Последний интервал между кадрами
+        self.interval = None
+        # Джиттер интервалов между кадрами, сек
+        self.jitter = 0.0
+
+    def update(self, rssi, now):
+        """ Учесть принятый кадр """
+        self.packets += 1
+        self.last_rssi = rssi
+        if self.avg_rssi is None:
+            self.avg_rssi = self.min_rssi = self.max_rssi = rssi
+        else:
+            self.avg_rssi += (rssi - self.avg_rssi) * self.RSSI_WEIGHT
+            self.min_rssi = min(self.min_rssi, rssi)
+            self.max_rssi = max(self.max_rssi, rssi)
+
+        if self.last_seen is not None:
+            __interval = now - self.last_seen
+            if self.interval is not None:
+                __delta = abs(__interval - self.interval)
+                self.jitter += (__delta - self.jitter) * self.JITTER_WEIGHT
+            self.interval = __interval
+        self.last_seen = now
+
+    def as_dict(self):
+        return dict((field, getattr(self, field)) for field in self.__slots__)
+
+
+class LinkTable(object):
+    """ Таблица качества радиоканала по идентификаторам узлов """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.links = {}
+        # Поврежденные кадры, по которым нельзя определить отправителя
+        self.damaged = 0
+
+    def observe(self, frame):
+        """
+            Учесть кадр (packet, rssi, received_at) из радиоканала.
+            Кадр короче заголовка (5 байт) считается поврежденным.
+        """
+        __payload, __rssi, __received_at = frame
+        if len(__payload) <= 1:
+            self.frame_damaged()
+        elif len(__payload) < 5:
+            self.frame_damaged(__payload[1])
+        else:
+            self.frame(__payload[1], __rssi, __received_at)
+
+    def frame(self, node_id, rssi, now=None):
+        """ Учесть кадр от узла node_id """
+        __now = time() if now is None else now
+        with self.lock:
+            __link = self.links.get(node_id)
+            if __link is None:
+                __link = self.links[node_id] = LinkStats()
+            __link.update(rssi, __now)
+
+    def frame_damaged(self, node_id=None):
+        """ Учесть поврежденный кадр """
+        with self.lock:
+            if node_id is None:
+                self.damaged += 1
+                return
+            __link = self.links.get(node_id)
+            if __link is None:
+                __link = self.links[node_id] = LinkStats()
+            __link.damaged += 1
+
+    def frame_duplicate(self, node_id):
+        """ Учесть повтор уже принятого кадра """
+        with self.lock:
+            __link = self.links.get(node_id)
+            if __link is None:
+                __link = self.links[node_id] = LinkStats()
+            __link.duplicates += 1
+
+    def frames_lost(self, node_id, count):
+        """ Учесть count кадров, пропущенных по номерам """
+        with self.lock:
+            __link = self.links.get(node_id)
+            if __link is None:
+                __link = self.links[node_id] = LinkStats()
+            __link.lost += count
+
+    def get(self, node_id):
+        """ Показатели узла или None """
+        return self.links.get(node_id)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                'damaged': self.damaged,
+                'nodes': dict((str(node_id), link.as_dict())
+                              for node_id, link in self.links.items()),
+            }
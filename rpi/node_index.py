@@ -0,0 +1,62 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+
+
+class NodeIndex(object):
+    """
+        Индексы групп, датчиков и устройств хаба для поиска за O(1).
+        Должны изменяться вместе со списками хаба в методах add_*/edit_*/remove_*
+    """
+    def __init__(self):
+        # Имя группы -> группа
+        self.groups = {}
+        # Радиоидентификатор -> датчик
+        self.sencors = {}
+        # Радиоидентификатор -> устройство
+        self.devices = {}
+        # (имя группы, имя устройства) -> устройство
+        self.device_names = {}
+
+    # GROUPS #
+
+    def add_group(self, group):
+        self.groups[group.name] = group
+
+    def remove_group(self, group):
+        self.groups.pop(group.name, None)
+
+    # SENCORS #
+
+    def add_sencor(self, sencor):
+        self.sencors[sencor.sencor_id] = sencor
+
+    def remove_sencor(self, sencor):
+        self.sencors.pop(sencor.sencor_id, None)
+
+    # DEVICES #
+
+    def add_device(self, device):
+        self.devices[device.device_id] = device
+        self.device_names[(device.group_name, device.name)] = device
+
+    def remove_device(self, device):
+        self.devices.pop(device.device_id, None)
+        self.device_names.pop((device.group_name, device.name), None)
+
+    def get_device_by_name(self, group_name, name):
+        """ Устройство по имени группы и собственному имени или None """
+        return self.device_names.get((group_name, name))
+
+    # FRAMES #
+
+    def lookup(self, node_id):
+        """
+            Поиск узла по радиоидентификатору отправителя кадра.
+            Датчики имеют приоритет над устройствами.
+            @return: датчик, устройство или None
+        """
+        __node = self.sencors.get(node_id)
+        if __node is None:
+            __node = self.devices.get(node_id)
+        return __node
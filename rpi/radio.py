@@ -0,0 +1,369 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+
+import heapq
+import itertools
+import threading
+from time import time
+from concurrent.futures import Future
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .rfm69_lib.rfm69 import RadioError
+from .rfm69_lib.stats import Histogram
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class RadioScheduler(object):
+    """
+        Планировщик радиоканала.
+
+        Единолично владеет модулем RFM69: держит его в приеме, раздает
+        принятые кадры обработчику и передает пакеты из потокобезопасной
+        очереди. Передача прерывает прием сразу же, после нее модуль
+        возвращается в прием в том же вызове.
+
+        Для каждого пакета возвращается Future, результат которого -
+        кадр-подтверждение (packet, rssi, received_at) или None по таймауту.
+        Время ответа считается от передачи до приема кадра модулем
+        (received_at), а не до его обработки.
+        Передачу можно отложить до заданного момента (окна приема узла)
+        или до заданной паузы после кадра узла (expect_then_send): такая
+        передача планируется в потоке радиоканала сразу при приеме кадра.
+
+        Ошибка в цикле не останавливает поток: модуль переинициализируется
+        и цикл продолжается. При остановке все ожидающие Future
+        завершаются исключением RadioError.
+    """
+    # Максимальное время ожидания кадра в простое, сек
+    IDLE_WAIT = 1
+    # Пауза после неудачной переинициализации модуля, сек
+    ERROR_BACKOFF = 1
+
+    def __init__(self, rfm, frame_handler, noise_tracker=None,
+                 frame_observer=None):
+        """
+            @param: rfm - экземпляр RFM69
+            @param: frame_handler - функция, вызываемая с каждым принятым
+                    кадром (packet, rssi, received_at), не ставшим
+                    подтверждением
+            @param: noise_tracker - NoiseFloorTracker, опрашиваемый в простое
+            @param: frame_observer - функция, вызываемая с каждым принятым
+                    кадром, включая подтверждения
+        """
+        self.rfm = rfm
+        self.frame_handler = frame_handler
+        self.noise_tracker = noise_tracker
+        self.frame_observer = frame_observer
+        # Очередь запросов на передачу
+        self.tx_queue = queue.Queue()
+        # Событие наличия запросов на передачу (прерывает ожидание приема)
+        self.tx_event = threading.Event()
+        # Отложенные передачи: куча [время, порядковый номер, запрос]
+        self.scheduled = []
+        self.counter = itertools.count()
+        # Ожидающие кадра: [условие, Future, крайний срок, передача после
+        # кадра или None]
+        self.waiters = []
+        # Future начатых запросов, отмененных из других потоков
+        self.cancel_queue = queue.Queue()
+        # Время от передачи до подтверждения
+        self.rtt = Histogram()
+        # Ошибки цикла радиоканала
+        self.errors = 0
+        self.running = False
+        # Цикл завершен: новые запросы сразу завершаются ошибкой
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        """ Запустить поток радиоканала """
+        self.running = True
+        self.thread = threading.Thread(name='radio', target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """ Остановить поток радиоканала """
+        self.running = False
+        self._wakeup()
+        if self.thread is not None:
+            self.thread.join()
+
+    def submit(self, data, ack=None, timeout=1, at=None):
+        """
+            Поставить пакет в очередь на передачу
+            @param: data - пакет
+            @param: ack - условие f(frame) -> bool для кадра-подтверждения,
+                    None - подтверждение не ожидается
+            @param: timeout - время ожидания подтверждения, сек
+            @param: at - время передачи (time()), None - немедленно
+            @return: Future с кадром-подтверждением или None.
+                    Отложенную передачу можно отменить через cancel()
+        """
+        future = Future()
+        self.tx_queue.put((data, ack, timeout, future, at, None))
+        self._wakeup()
+        if self.stopped:
+            self._fail_queued()
+        return future
+
+    def expect(self, match, timeout):
+        """
+            Ожидать кадр, удовлетворяющий условию match, без передачи.
+            Такой кадр не передается обработчику.
+            @return: Future с кадром или None по таймауту
+        """
+        future = Future()
+        self.tx_queue.put((None, match, timeout, future, None, None))
+        self._wakeup()
+        if self.stopped:
+            self._fail_queued()
+        return future
+
+    def expect_then_send(self, match, timeout, data, gap, ack=None,
+                         ack_timeout=1):
+        """
+            Ожидать кадр match (маяк) и передать пакет через gap сек после
+            его приема модулем. Передача планируется в потоке радиоканала,
+            поэтому не зависит от загрузки потока-заказчика.
+            @param: data - пакет или функция без аргументов, возвращающая
+                    пакет в момент передачи
+            @param: ack, ack_timeout - как у submit
+            @return: Future с кадром-подтверждением или None (нет кадра
+                    match или подтверждения). beacon_at у Future - время
+                    приема кадра match или None
+        """
+        future = Future()
+        future.beacon_at = None
+        self.tx_queue.put((None, match, timeout, future, None,
+                           (data, gap, ack, ack_timeout)))
+        self._wakeup()
+        if self.stopped:
+            self._fail_queued()
+        return future
+
+    def cancel(self, future):
+        """
+            Отменить запрос. Еще не начатый отменяется сразу; начатый
+            (ожидание кадра или передача после него) снимается в потоке
+            радиоканала, его Future завершается с результатом None
+        """
+        if future.cancel():
+            return
+        self.cancel_queue.put(future)
+        self._wakeup()
+
+    def get_stats(self):
+        """ Статистика времени подтверждения, очереди и модуля """
+        __stats = {
+            'rtt': self.rtt.as_dict(),
+            'tx_queue': self.tx_queue.qsize(),
+            'scheduled': len(self.scheduled),
+            'waiters': len(self.waiters),
+            'errors': self.errors,
+            'spi': self.rfm.get_spi_stats(),
+            'tx': self.rfm.get_tx_stats(),
+            'airtime': self.rfm.get_airtime_stats(),
+        }
+        if self.noise_tracker is not None:
+            __stats['noise'] = self.noise_tracker.as_dict()
+        return __stats
+
+    def _wakeup(self):
+        """ Прервать ожидание приема """
+        self.tx_event.set()
+        with self.rfm.rx_available:
+            self.rfm.rx_available.notify_all()
+
+    def run(self):
+        """ Loop-worker потока радиоканала """
+        try:
+            while self.running:
+                try:
+                    # Ничего не делает, если прием уже идет
+                    self.rfm.start_receiving()
+                    self._step()
+                except Exception:
+                    self.errors += 1
+                    log.exception("Radio loop failed")
+                    self._recover()
+        finally:
+            self.stopped = True
+            self._fail_pending()
+            try:
+                self.rfm.stop_receiving()
+            except Exception:
+                log.exception("Failed to stop receiving")
+
+    def _step(self):
+        """ Одна итерация цикла радиоканала """
+        self._transmit_pending()
+        frame = self.rfm.get_frame(self._wait_time(),
+                                   cancel_event=self.tx_event)
+        if frame is not None:
+            self._dispatch(frame)
+            # Кадры, принятые за время обработки, разбираются до истечения
+            # ожиданий: среди них может быть подтверждение, пришедшее в срок
+            for frame in self.rfm.drain():
+                self._dispatch(frame)
+        self._expire_waiters()
+        # Оценка уровня шума в паузах между кадрами
+        if self.noise_tracker is not None:
+            self.noise_tracker.tick()
+
+    def _recover(self):
+        """ Переинициализировать модуль после ошибки цикла """
+        try:
+            self.rfm.stop_receiving()
+            self.rfm.reset()
+            self.rfm.write_config()
+        except Exception:
+            log.exception("Radio module re-initialisation failed")
+            # Не крутить цикл вхолостую при неисправном модуле
+            self.tx_event.wait(self.ERROR_BACKOFF)
+
+    def _fail_queued(self):
+        """ Завершить ошибкой запросы, оставшиеся в очереди """
+        while True:
+            try:
+                __request = self.tx_queue.get_nowait()
+            except queue.Empty:
+                return
+            if __request[3].set_running_or_notify_cancel():
+                __request[3].set_exception(
+                    RadioError("Radio scheduler stopped"))
+
+    def _fail_pending(self):
+        """ Завершить ошибкой все ожидающие Future при остановке цикла """
+        self._fail_queued()
+        while self.scheduled:
+            __future = heapq.heappop(self.scheduled)[2][3]
+            if __future.running() or \
+                    __future.set_running_or_notify_cancel():
+                __future.set_exception(RadioError("Radio scheduler stopped"))
+        while self.waiters:
+            self.waiters.pop()[1].set_exception(
+                RadioError("Radio scheduler stopped"))
+
+    def _wait_time(self):
+        """ Время ожидания кадра до ближайшего крайнего срока """
+        __wait = self.IDLE_WAIT
+        for __waiter in self.waiters:
+            __wait = min(__wait, __waiter[2] - time())
+        if self.scheduled:
+            __wait = min(__wait, self.scheduled[0][0] - time())
+        return max(__wait, 0)
+
+    def _transmit_pending(self):
+        """ Передать все пакеты из очереди и наступившие отложенные """
+        self.tx_event.clear()
+        self._cancel_requested()
+        __now = time()
+        __immediate = []
+        while True:
+            try:
+                __request = self.tx_queue.get_nowait()
+            except queue.Empty:
+                break
+            if __request[4] is not None and __request[4] > __now:
+                heapq.heappush(self.scheduled,
+                               [__request[4], next(self.counter), __request])
+            else:
+                __immediate.append(__request)
+        # Отложенные передачи привязаны к окну приема узла, поэтому первыми
+        while self.scheduled and self.scheduled[0][0] <= time():
+            self._transmit(*heapq.heappop(self.scheduled)[2])
+        for __request in __immediate:
+            self._transmit(*__request)
+
+    def _transmit(self, data, ack, timeout, future, at, then):
+        """ Передать пакет и зарегистрировать ожидание подтверждения """
+        # Передача после кадра продолжает уже начатый Future
+        if not future.running() and \
+                not future.set_running_or_notify_cancel():
+            return
+        __sent_at = time()
+        if data is not None:
+            try:
+                if callable(data):
+                    data = data()
+                self.rfm.send_packet(data)
+            except Exception as e:
+                log.error("Error during packet send")
+                future.set_exception(e)
+                return
+            __sent_at = time()
+        future.sent_at = __sent_at
+        if ack is None:
+            future.set_result(None)
+        else:
+            self.waiters.append([ack, future, __sent_at + timeout, then])
+
+    def _dispatch(self, frame):
+        """ Отдать кадр ожидающему или обработчику """
+        if self.frame_observer is not None:
+            try:
+                self.frame_observer(frame)
+            except Exception:
+                log.exception("Error in frame observer")
+        for __waiter in self.waiters:
+            # Кадр, принятый до передачи, не может быть ответом на нее
+            if frame[2] < __waiter[1].sent_at:
+                continue
+            try:
+                __matched = __waiter[0](frame)
+            except Exception:
+                log.exception("Error in ack matcher")
+                __matched = False
+            if __matched:
+                self.waiters.remove(__waiter)
+                __future = __waiter[1]
+                if __waiter[3] is not None:
+                    self._schedule_after(__future, frame, *__waiter[3])
+                    return
+                __future.acked_at = frame[2]
+                self.rtt.add(__future.acked_at - __future.sent_at)
+                __future.set_result(frame)
+                return
+        try:
+            self.frame_handler(frame)
+        except Exception:
+            log.error("Error during snc/dvc read")
+            log.exception("message")
+
+    def _cancel_requested(self):
+        """ Снять начатые запросы, отмененные через cancel() """
+        while True:
+            try:
+                __future = self.cancel_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.waiters = [__waiter for __waiter in self.waiters
+                            if __waiter[1] is not __future]
+            self.scheduled = [__entry for __entry in self.scheduled
+                              if __entry[2][3] is not __future]
+            heapq.heapify(self.scheduled)
+            if not __future.done():
+                __future.set_result(None)
+
+    def _schedule_after(self, future, frame, data, gap, ack, ack_timeout):
+        """ Запланировать передачу через gap сек после приема кадра """
+        future.beacon_at = frame[2]
+        heapq.heappush(self.scheduled, [
+            frame[2] + gap, next(self.counter),
+            (data, ack, ack_timeout, future, None, None)])
+
+    def _expire_waiters(self):
+        """ Завершить по таймауту просроченные ожидания """
+        __now = time()
+        for __waiter in list(self.waiters):
+            if __waiter[2] <= __now:
+                self.waiters.remove(__waiter)
+                __waiter[1].set_result(None)
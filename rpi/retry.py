@@ -0,0 +1,172 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+
+import threading
+from collections import deque
+from math import ceil, log as ln
+from random import uniform
+
+
+class RetryState(object):
+    """ Состояние политики повторов одного устройства """
+    __slots__ = ('srtt', 'rttvar', 'results', 'commands', 'delivered',
+                 'attempts', 'attempts_per_success')
+
+    def __init__(self, history):
+        # Сглаженное время ответа и его отклонение (RFC 6298)
+        self.srtt = None
+        self.rttvar = None
+        # Исходы последних попыток (True - команда подтверждена)
+        self.results = deque(maxlen=history)
+        self.commands = 0
+        self.delivered = 0
+        self.attempts = 0
+        # Число попыток -> число доставленных команд
+        self.attempts_per_success = {}
+
+
+class RetryPolicy(object):
+    """
+        Адаптивная политика повторов управляющих команд.
+
+        Время ожидания ответа считается по измеренному времени ответа
+        устройства как в TCP (RTO = SRTT + 4 * RTTVAR, RFC 6298), время
+        измеряется только по первой попытке (алгоритм Карна): ответ на
+        повтор нельзя отличить от запоздавшего ответа на предыдущую.
+        Обмен по радио занимает десятки миллисекунд, поэтому RTO не
+        ограничен снизу 1 сек, как в RFC 6298 (initial_timeout - только
+        до первого измерения): нижняя граница - два сглаженных времени
+        ответа, но не меньше min_timeout. Задержки обработки кадров хабом
+        RTO перекрывать не нужно: время ответа отсчитывается по моменту
+        приема кадра, а принятые кадры разбираются до истечения ожиданий.
+
+        Число попыток выбирается так, чтобы при доле успешных попыток за
+        последние history попыток команда дошла с вероятностью target,
+        но не больше max_attempts. Устройству, которое почти не отвечает
+        (доля успешных попыток ниже dead_rate), дается min_attempts:
+        повторы ему не помогут, а задерживают остальные команды.
+        Между попытками - экспоненциально растущая пауза со случайным
+        разбросом, чтобы повторы разных устройств не совпадали.
+    """
+    def __init__(self, initial_timeout=1.0, min_timeout=0.05,
+                 max_timeout=2.0, default_attempts=5, min_attempts=2,
+                 max_attempts=5, target=0.99, dead_rate=0.2, history=50,
+                 base_delay=0.02, max_delay=0.5, backoff=2.0):
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.default_attempts = default_attempts
+        self.min_attempts = min_attempts
+        self.max_attempts = max_attempts
+        self.target = target
+        self.dead_rate = dead_rate
+        self.history = history
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.lock = threading.Lock()
+        self.devices = {}
+
+    def _state(self, device_id):
+        __state = self.devices.get(device_id)
+        if __state is None:
+            __state = self.devices[device_id] = RetryState(self.history)
+        return __state
+
+    def timeout(self, device_id):
+        """ Время ожидания ответа устройства, сек """
+        with self.lock:
+            __state = self._state(device_id)
+            if __state.srtt is None:
+                return self.initial_timeout
+            __rto = max(__state.srtt + 4 * __state.rttvar,
+                        2 * __state.srtt)
+        return min(self.max_timeout, max(self.min_timeout, __rto))
+
+    def attempts(self, device_id):
+        """ Число попыток отправки команды устройству """
+        with self.lock:
+            __results = self._state(device_id).results
+            if len(__results) < 5:
+                return self.default_attempts
+            # Доля успешных попыток (со сглаживанием Лапласа)
+            __p = (sum(__results) + 1.0) / (len(__results) + 2.0)
+        if __p >= 1 or __p < self.dead_rate:
+            return self.min_attempts
+        # 1 - (1 - p)^n >= target
+        __n = int(ceil(ln(1 - self.target) / ln(1 - __p)))
+        return min(self.max_attempts, max(self.min_attempts, __n))
+
+    def delay(self, attempt):
+        """ Пауза перед попыткой номер attempt (с нуля), сек """
+        if attempt == 0:
+            return 0
+        __delay = min(self.max_delay,
+                      self.base_delay * self.backoff ** (attempt - 1))
+        return uniform(__delay / 2, __delay)
+
+    def record_attempt(self, device_id, attempt, delivered, rtt=None):
+        """
+            Учесть исход попытки
+            @param: attempt - номер попытки (с нуля)
+            @param: delivered - подтвердило ли устройство команду (ответ с
+                    неверным состоянием - неудачная попытка)
+            @param: rtt - время ответа, сек, или None, если ответа нет
+        """
+        with self.lock:
+            __state = self._state(device_id)
+            __state.results.append(bool(delivered))
+            # Время ответа учитывается только по подтверждению первой попытки
+            if not delivered or rtt is None or attempt != 0:
+                return
+            if __state.srtt is None:
+                __state.srtt = rtt
+                __state.rttvar = rtt / 2
+            else:
+                __state.rttvar += (abs(__state.srtt - rtt) -
+                                   __state.rttvar) / 4
+                __state.srtt += (rtt - __state.srtt) / 8
+
+    def record_command(self, device_id, attempts, delivered):
+        """ Учесть итог отправки команды за attempts попыток """
+        with self.lock:
+            __state = self._state(device_id)
+            __state.commands += 1
+            __state.attempts += attempts
+            if delivered:
+                __state.delivered += 1
+                __state.attempts_per_success[attempts] = \
+                    __state.attempts_per_success.get(attempts, 0) + 1
+
+    def forget(self, device_id):
+        """ Забыть историю удаленного устройства """
+        with self.lock:
+            self.devices.pop(device_id, None)
+
+    def get_stats(self):
+        """ Статистика повторов по устройствам """
+        __stats = {}
+        with self.lock:
+            for __device_id, __state in self.devices.items():
+                __stats[str(__device_id)] = {
+                    'srtt': __state.srtt,
+                    'rttvar': __state.rttvar,
+                    'commands': __state.commands,
+                    'delivered': __state.delivered,
+                    'attempts': __state.attempts,
+                    'attempts_per_success': (
+                        float(__state.attempts) / __state.delivered
+                        if __state.delivered else None),
+                    'attempts_histogram': dict(
+                        (str(n), count) for n, count
+                        in __state.attempts_per_success.items()),
+                    'success_rate': (
+                        float(sum(__state.results)) / len(__state.results)
+                        if __state.results else None),
+                }
+        for __device_id in __stats:
+            __stats[__device_id]['timeout'] = self.timeout(int(__device_id))
+            __stats[__device_id]['max_attempts'] = \
+                self.attempts(int(__device_id))
+        return __stats
@@ -0,0 +1,102 @@
+from collections import deque
+from threading import Lock
+from time import time
+
+
+# Crystal oscillator frequency of the RFM69
+FXOSC = 32000000
+
+
+def bitrate(config):
+    """ The configured bitrate in bits per second. """
+    return FXOSC / float((config.bitrate_msb << 8) | config.bitrate_lsb)
+
+
+def packet_airtime(config, payload_length):
+    """ Time on air, in seconds, of a packet carrying `payload_length` bytes:
+        preamble, sync word, length byte (variable-length packets), payload and CRC.
+    """
+    overhead = (config.preamble_msb << 8) | config.preamble_lsb
+    if config.sync_config & 0x80:
+        overhead += ((config.sync_config >> 3) & 0x7) + 1
+    if config.packet_config_1.variable_length:
+        overhead += 1
+    if config.packet_config_1.crc:
+        overhead += 2
+    return (overhead + payload_length) * 8 / bitrate(config)
+
+
+class DutyCycleExceeded(Exception):
+    pass
+
+
+class DutyCycleMonitor(object):
+    """ Rolling airtime accounting, globally and per device.
+
+        window -- the rolling window in seconds
+        budget -- the maximum fraction of `window` which may be spent transmitting,
+                  or None for no limit
+    """
+    def __init__(self, window=3600, budget=None):
+        self.window = window
+        self.budget = budget
+        self.lock = Lock()
+        self.records = deque()
+        self.used = 0.0
+        self.per_device = {}
+        self.refused = 0
+
+    def _expire(self, now):
+        horizon = now - self.window
+        while self.records and self.records[0][0] < horizon:
+            _, airtime, device = self.records.popleft()
+            self.used -= airtime
+            remaining = self.per_device[device] - airtime
+            if remaining <= 1e-9:
+                del self.per_device[device]
+            else:
+                self.per_device[device] = remaining
+
+    def check(self, airtime, now=None):
+        """ Raise DutyCycleExceeded if transmitting for `airtime` more seconds
+            would go over the budget.
+        """
+        if self.budget is None:
+            return
+        now = time() if now is None else now
+        with self.lock:
+            self._expire(now)
+            if self.used + airtime > self.budget * self.window:
+                self.refused += 1
+                raise DutyCycleExceeded("Airtime budget of %.2f%% exhausted (%.3fs used in %ss)" %
+                                        (self.budget * 100, self.used, self.window))
+
+    def record(self, device, airtime, now=None):
+        now = time() if now is None else now
+        with self.lock:
+            self._expire(now)
+            self.records.append((now, airtime, device))
+            self.used += airtime
+            self.per_device[device] = self.per_device.get(device, 0.0) + airtime
+
+    def duty_cycle(self, device=None, now=None):
+        """ Fraction of the window spent transmitting, overall or to one device. """
+        now = time() if now is None else now
+        with self.lock:
+            self._expire(now)
+            used = self.used if device is None else self.per_device.get(device, 0.0)
+        return used / self.window
+
+    def as_dict(self, now=None):
+        now = time() if now is None else now
+        with self.lock:
+            self._expire(now)
+            return {
+                'window': self.window,
+                'budget': self.budget,
+                'airtime': self.used,
+                'duty_cycle': self.used / self.window,
+                'refused': self.refused,
+                'devices': dict((str(device), used / self.window)
+                                for device, used in self.per_device.items()),
+            }
@@ -0,0 +1,46 @@
+from time import sleep
+
+
+class HardwareBackend(object):
+    """ SPI and GPIO access for an RFM69 wired to a Raspberry Pi.
+
+        The RPi.GPIO and spidev modules are imported on construction, so the rest
+        of the radio code can be imported (and run against another backend) on
+        machines which don't have them.
+    """
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        import spidev
+
+        self.GPIO = GPIO
+        self.spidev = spidev
+        self.GPIO.setmode(GPIO.BCM)
+        self.GPIO.setwarnings(False)
+
+    def setup_input(self, pin):
+        self.GPIO.setup(pin, self.GPIO.IN)
+
+    def pulse_reset(self, pin, hold=0.05, settle=0.05):
+        """ Drive the reset pin high for `hold` seconds, then release it and
+            give the module `settle` seconds to start up.
+        """
+        self.GPIO.setup(pin, self.GPIO.OUT)
+        self.GPIO.output(pin, 1)
+        sleep(hold)
+        self.GPIO.setup(pin, self.GPIO.IN)
+        sleep(settle)
+
+    def add_event_detect(self, pin, callback):
+        """ Call `callback(pin)` on every rising edge of `pin`. """
+        self.GPIO.add_event_detect(pin, self.GPIO.RISING, callback=callback)
+
+    def remove_event_detect(self, pin):
+        self.GPIO.remove_event_detect(pin)
+
+    def open_spi(self, channel, max_speed_hz, device=0):
+        """ Open the SPI device. Returns an object with an `xfer2` method. """
+        spi = self.spidev.SpiDev()
+        spi.open(channel, device)
+        spi.bits_per_word = 8
+        spi.max_speed_hz = max_speed_hz
+        return spi
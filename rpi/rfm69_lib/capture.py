@@ -0,0 +1,144 @@
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from threading import Lock
+from time import sleep, time
+import os
+
+
+# File header: magic and format version
+MAGIC = b'RFMCAP\x00\x01'
+# Record header: timestamp, direction, RSSI in half-dB steps, payload length
+RECORD = Struct('<dBhB')
+
+RX = 0
+TX = 1
+# RSSI of records which have none (transmitted frames)
+NO_RSSI = -0x8000
+
+
+class CaptureWriter(object):
+    """ Appends received and transmitted frames to a capture file.
+
+        Each record is a 12-byte header (timestamp, direction, RSSI, length)
+        followed by the frame bytes. The file is only ever appended to, so a
+        capture survives a crash up to the last flushed record, and several
+        sessions can be recorded into the same file. Records are flushed at
+        most `flush_interval` seconds after being written.
+    """
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = Lock()
+        self.records = 0
+        self.last_flush = time()
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+
+    def write(self, direction, data, rssi=None, timestamp=None):
+        """ Record one frame. `rssi` is in dBm, None for transmitted frames. """
+        now = time()
+        header = RECORD.pack(now if timestamp is None else timestamp, direction,
+                             NO_RSSI if rssi is None else int(round(rssi * 2)),
+                             len(data))
+        with self.lock:
+            self.file.write(header)
+            self.file.write(data)
+            self.records += 1
+            if now - self.last_flush >= self.flush_interval:
+                self.file.flush()
+                self.last_flush = now
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class CaptureReader(object):
+    """ Reads a capture file through a memory map.
+
+        Iterating yields (timestamp, direction, packet, rssi) tuples, where
+        `packet` is a read-only memoryview into the map, so nothing is copied
+        until a consumer needs to. Release (or drop) each packet view before
+        closing the reader. A record cut short by a crash ends the capture.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        if os.fstat(self.file.fileno()).st_size < len(MAGIC):
+            raise ValueError("%s is not a capture file" % path)
+        self.map = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("%s is not a capture file" % path)
+
+    def __iter__(self):
+        view = memoryview(self.map)
+        size = len(self.map)
+        offset = len(MAGIC)
+        try:
+            while offset + RECORD.size <= size:
+                timestamp, direction, rssi, length = RECORD.unpack_from(view, offset)
+                offset += RECORD.size
+                if offset + length > size:
+                    break
+                yield (timestamp, direction, view[offset:offset + length],
+                       None if rssi == NO_RSSI else rssi / 2.0)
+                offset += length
+        finally:
+            view.release()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def replay(path, handler, speed=1.0, directions=(RX,)):
+    """ Feed the frames of a capture to `handler` as (packet, rssi, received_at)
+        tuples, the way a RadioScheduler hands them to the hub. `received_at` is
+        the time of the replay, so the frames fit the consumer's clock.
+
+        speed -- 1.0 replays in real time, 10 ten times faster, and 0 or None
+                 as fast as possible
+        directions -- which records to replay; received frames by default
+
+        Returns a dict with the number of frames replayed, the wall-clock time
+        taken, the span of the capture and the frame rate achieved.
+    """
+    frames = 0
+    first = None
+    start = time()
+    with CaptureReader(path) as reader:
+        for timestamp, direction, packet, rssi in reader:
+            if direction not in directions:
+                packet.release()
+                continue
+            if first is None:
+                first = timestamp
+            if speed:
+                delay = start + (timestamp - first) / speed - time()
+                if delay > 0:
+                    sleep(delay)
+            # The consumer may keep the frame, so it gets its own copy
+            frame = (bytearray(packet), rssi, time())
+            packet.release()
+            handler(frame)
+            frames += 1
+            last = timestamp
+    elapsed = time() - start
+    return {
+        'frames': frames,
+        'elapsed': elapsed,
+        'span': last - first if frames else 0.0,
+        'rate': frames / elapsed if elapsed else None,
+    }
@@ -144,6 +144,9 @@ class RFM69Configuration(object):
         self.rx_timeout_1 = 0
         self.rx_timeout_2 = 0
 
+        self.preamble_msb = RF.PREAMBLESIZE_MSB_VALUE
+        self.preamble_lsb = RF.PREAMBLESIZE_LSB_VALUE
+
         self.sync_config = RF.SYNC_RLDA
         self.sync_value_1 = (0x0105>>8)
         self.sync_value_2 = 0x0105
@@ -188,6 +191,8 @@ class RFM69Configuration(object):
         regs[Register.RSSITHRESH] = self.rssi_threshold
         regs[Register.RXTIMEOUT1] = self.rx_timeout_1
         regs[Register.RXTIMEOUT2] = self.rx_timeout_2
+        regs[Register.PREAMBLEMSB] = self.preamble_msb
+        regs[Register.PREAMBLELSB] = self.preamble_lsb
         regs[Register.SYNCCONFIG] = self.sync_config
         regs[Register.SYNCVALUE1] = self.sync_value_1
         regs[Register.SYNCVALUE2] = self.sync_value_2
@@ -0,0 +1,133 @@
+from bisect import insort
+from collections import deque
+from time import time
+import logging
+
+from .configuration import IRQFlags1, OpMode
+from .constants import Register, RF
+
+
+class NoiseFloorTracker(object):
+    """ Keeps the RSSI threshold a fixed margin above the local noise floor.
+
+        Unlike `RFM69.calibrate_rssi_threshold` this never blocks: `tick` is called
+        from the radio loop, and at most once per `interval` it takes one RSSI sample
+        while the receiver is idle (running, no frame buffered, no sync word being
+        received). The noise floor is the `percentile` of the last `window` samples,
+        and the threshold is moved when it's off by at least `min_step` dB, staying
+        within `bounds`.
+
+        It also catches false wake-ups: if the receiver was triggered by the RSSI
+        threshold but hasn't found a sync word on two samples running, it is stuck
+        on noise, so reception is restarted and `rfm.rx_restarts` is incremented.
+        The false wake-up count is kept per threshold setting, to show the effect of
+        each adjustment.
+    """
+    def __init__(self, rfm, window=120, percentile=0.8, margin=3, bounds=(-120, -80),
+                 min_step=1, interval=1.0, update_every=10):
+        self.log = logging.getLogger(__name__)
+        self.rfm = rfm
+        self.window = window
+        self.percentile = percentile
+        self.margin = margin
+        self.bounds = bounds
+        self.min_step = min_step
+        self.interval = interval
+        self.update_every = update_every
+
+        self.samples = deque()
+        self.sorted_samples = []
+        # Samples taken since the last threshold update
+        self.pending = 0
+        self.last_sample = 0
+        self.woken = False
+        self.false_wakeups = 0
+
+        # False wake-ups per threshold setting; the last entry is the current one
+        self.history = deque(maxlen=20)
+        self._new_epoch(rfm.get_rssi_threshold())
+
+    def _new_epoch(self, threshold):
+        self.history.append({'threshold': threshold, 'since': time(), 'false_wakeups': 0})
+
+    def noise_floor(self):
+        """ The current noise floor estimate in dBm, or None without samples. """
+        if not self.sorted_samples:
+            return None
+        index = min(len(self.sorted_samples) - 1, int(len(self.sorted_samples) * self.percentile))
+        return self.sorted_samples[index]
+
+    def tick(self, now=None):
+        """ Take a sample if one is due and the receiver is idle. """
+        now = time() if now is None else now
+        if now - self.last_sample < self.interval:
+            return
+        rfm = self.rfm
+        with rfm.spi_lock:
+            if not rfm.receiving or rfm.config.opmode.mode != OpMode.RX or rfm.rx_buffer:
+                return
+            self.last_sample = now
+            flags = rfm.read_register(IRQFlags1)
+            if flags.sync_address_match:
+                # A packet is being received
+                self.woken = False
+                return
+            if flags.rssi and self.woken:
+                self._restart_rx()
+            self.woken = flags.rssi
+            rssi = rfm.get_rssi()
+
+        self._add_sample(rssi)
+        self.pending += 1
+        if self.pending >= self.update_every:
+            self.pending = 0
+            self._update_threshold()
+
+    def _restart_rx(self):
+        self.rfm.spi_write(Register.PACKETCONFIG2,
+                           self.rfm.spi_read(Register.PACKETCONFIG2) | RF.PACKET2_RXRESTART)
+        self.rfm.rx_restarts += 1
+        self.false_wakeups += 1
+        self.history[-1]['false_wakeups'] += 1
+        self.woken = False
+
+    def _add_sample(self, rssi):
+        self.samples.append(rssi)
+        insort(self.sorted_samples, rssi)
+        if len(self.samples) > self.window:
+            self.sorted_samples.remove(self.samples.popleft())
+
+    def _update_threshold(self):
+        floor = self.noise_floor()
+        target = min(self.bounds[1], max(self.bounds[0], floor + self.margin))
+        current = self.history[-1]['threshold']
+        if abs(target - current) < self.min_step:
+            return
+        # The register holds half-dB steps
+        target = round(target * 2) / 2.0
+        self.rfm.set_rssi_threshold(target)
+        self.log.info("Noise floor %.1fdBm, RSSI threshold %.1fdB -> %.1fdB", floor, current, target)
+        self._new_epoch(target)
+
+    def as_dict(self):
+        """ Current estimate, threshold and false wake-ups per threshold setting. """
+        now = time()
+        epochs = []
+        for epoch in reversed(self.history):
+            duration = now - epoch['since']
+            epochs.append({
+                'threshold': epoch['threshold'],
+                'duration': duration,
+                'false_wakeups': epoch['false_wakeups'],
+                'false_wakeups_per_hour': epoch['false_wakeups'] * 3600 / duration if duration else None,
+            })
+            now = epoch['since']
+        epochs.reverse()
+        return {
+            'noise_floor': self.noise_floor(),
+            'threshold': self.history[-1]['threshold'],
+            'samples': len(self.samples),
+            'false_wakeups': self.false_wakeups,
+            'rx_restarts': self.rfm.rx_restarts,
+            'epochs': epochs,
+        }
@@ -1,38 +1,84 @@
 from __future__ import division, absolute_import, print_function, unicode_literals
 
 
-class RegisterValue(object):
+class RegisterMeta(type):
+    """ Metaclass which turns a register's FORMAT into code at class-creation time.
+
+        Every class with a FORMAT gets `__slots__` for its named fields, and a `pack`
+        method and `unpack` classmethod generated for that exact layout, so reading a
+        register costs a single object allocation and a few shifts. A class without a
+        FORMAT of its own or inherited must be declared `abstract = True`; anything else
+        is a TypeError at definition time rather than a register that cannot be packed.
+    """
+    def __new__(mcs, name, bases, namespace):
+        abstract = namespace.pop('abstract', False)
+        if not abstract and 'FORMAT' not in namespace and \
+                not any(hasattr(base, 'FORMAT') for base in bases):
+            raise TypeError("%s has no FORMAT" % name)
+        if 'FORMAT' in namespace and '__slots__' not in namespace:
+            namespace['__slots__'] = tuple(str(field) for field, length in namespace['FORMAT']
+                                           if isinstance(field, str))
+        return super(RegisterMeta, mcs).__new__(mcs, str(name), bases, namespace)
+
+    def __init__(cls, name, bases, namespace):
+        super(RegisterMeta, cls).__init__(name, bases, namespace)
+        if 'FORMAT' in namespace:
+            cls._compile()
+
+    def _compile(cls):
+        # The field types come from the defaults set in __init__
+        default = cls()
+        pack_terms = []
+        unpack_lines = []
+        scope = {'_new': object.__new__}
+        constant = 0
+        pos = 8
+        for field, length in cls.FORMAT:
+            pos -= length
+            assert pos >= 0
+            mask = 2**length - 1
+            if not isinstance(field, str):
+                constant |= int(field) << pos
+                continue
+
+            field_type = type(getattr(default, field))
+            pack_terms.append("(int(self.%s) << %d)" % (field, pos))
+            if field_type is bool and length == 1:
+                unpack_lines.append("reg.%s = (value & %d) != 0" % (field, 1 << pos))
+            elif field_type is int:
+                unpack_lines.append("reg.%s = (value >> %d) & %d" % (field, pos, mask))
+            else:
+                scope['_type_' + field] = field_type
+                unpack_lines.append("reg.%s = _type_%s((value >> %d) & %d)" % (field, field, pos, mask))
+
+        if constant or not pack_terms:
+            pack_terms.append(str(constant))
+
+        source = "def pack(self):\n    return %s\n" % " | ".join(pack_terms)
+        source += "def unpack(cls, value):\n    reg = _new(cls)\n"
+        source += "".join("    %s\n" % line for line in unpack_lines)
+        source += "    return reg\n"
+        exec(compile(source, "<register %s>" % cls.__name__, "exec"), scope)
+
+        cls.pack = scope['pack']
+        cls.unpack = classmethod(scope['unpack'])
+
+
+_RegisterBase = RegisterMeta(str('_RegisterBase'), (object,), {'__slots__': (), 'abstract': True})
+
+
+class RegisterValue(_RegisterBase):
     """ Represents a single 8-bit register.
         Allows booleans and int members to be packed into and unpacked from the register value.
         Removes the need to keep ANDing and ORing everything.
 
         To use: add a static FORMAT class variable which is a list of 2-tuples, in the order
         they're packed into the register (MSB first). The first element of the tuple is the name
-        of the class member, the second is the number of bits it takes up.
+        of the class member, the second is the number of bits it takes up. Set the default of
+        every member in __init__; its type is used when unpacking.
         """
-    def pack(self):
-        result = 0
-        pos = 8
-        for field, length in self.FORMAT:
-            pos -= length
-            assert pos >= 0
-            if isinstance(field, str):
-                val = getattr(self, field)
-            else:
-                val = field
-            result |= int(val) << pos
-        return result
-
-    @classmethod
-    def unpack(cls, value):
-        reg = cls()
-        pos = 8
-        for field, length in reg.FORMAT:
-            pos -= length
-            bits = (value >> pos) & (2**length - 1)
-            if isinstance(field, str):
-                setattr(reg, field, type(getattr(reg, field))(bits))
-        return reg
+    __slots__ = ()
+    abstract = True
 
     def __repr__(self):
         info = []
@@ -1,13 +1,15 @@
 #from __future__ import division, absolute_import, print_function, unicode_literals
 from time import sleep, time
-from threading import Event
+from threading import Event, Condition, RLock
+from collections import deque
 import logging
 
-import RPi.GPIO as GPIO
-import spidev
-
+from .airtime import DutyCycleMonitor, packet_airtime
+from .backend import HardwareBackend
+from .capture import RX, TX
 from .configuration import IRQFlags1, IRQFlags2, OpMode, Temperature1, RSSIConfig
 from .constants import Register, RF
+from .stats import Histogram
 
 
 class RadioError(Exception):
@@ -33,20 +35,97 @@ def wait_for(condition, timeout=5, check_time=0.005):
 
 class RFM69(object):
     """ Interface for the RFM69 series of radio modules. """
-    def __init__(self, reset_pin=None, dio0_pin=None, spi_channel=None, config=None):
+
+    # Reset timing. The datasheet asks for >100us on the reset pin and 5ms
+    # before the module is ready.
+    RESET_HOLD = 0.001
+    RESET_SETTLE = 0.01
+
+    # How long send_packet waits for the PacketSent interrupt before falling
+    # back to polling IRQFlags2.
+    PACKET_SENT_TIMEOUT = 0.5
+
+    # Bits which don't read back as written, masked out when verifying the
+    # configuration. Registers mapped to 0 aren't compared at all.
+    VERIFY_MASKS = {
+        Register.OPMODE: 0xFF & ~RF.OPMODE_LISTENABORT,
+        Register.OSC1: 0x00,
+        Register.PACKETCONFIG2: 0xFF & ~RF.PACKET2_RXRESTART,
+        0xFF: 0x00,
+    }
+
+    # Registers which the module changes by itself (or which trigger an action
+    # when written). They are never served from, or filtered by, the shadow.
+    VOLATILE_REGISTERS = frozenset([
+        Register.FIFO, Register.OSC1, Register.VERSION, Register.AFCFEI,
+        Register.AFCMSB, Register.AFCLSB, Register.FEIMSB, Register.FEILSB,
+        Register.RSSICONFIG, Register.RSSIVALUE, Register.IRQFLAGS1, Register.IRQFLAGS2,
+        Register.TEMP1, Register.TEMP2, 0xFF,
+    ])
+
+    # Self-clearing command bits. A write with one of them set always goes to
+    # the module, and the shadow keeps the value without it.
+    TRIGGER_BITS = {
+        Register.OPMODE: RF.OPMODE_LISTENABORT,
+        Register.PACKETCONFIG2: RF.PACKET2_RXRESTART,
+    }
+
+    def __init__(self, reset_pin=None, dio0_pin=None, spi_channel=None, config=None,
+                 rx_buffer_size=64, backend=None, spi_speed_hz=50000,
+                 duty_cycle_budget=None, duty_cycle_window=3600, spi_device=0,
+                 capture=None):
         """ Initialise the object and configure the receiver.
 
             reset_pin -- the GPIO pin number which is attached to the reset pin of the RFM69
             dio0_pin  -- the GPIO pin number which is attached to the DIO0 pin of the RFM69
             spi_channel -- the SPI channel used by the RFM69
+            spi_device -- the chip select on that channel, for several modules on one bus
             config    -- an instance of `RFM69Configuration`
+            rx_buffer_size -- how many received frames the receive engine keeps before
+                    the oldest ones are overwritten
+            backend   -- the SPI/GPIO backend. Defaults to `HardwareBackend`; pass a
+                    `simulator.SimulatedBackend` to run without a Raspberry Pi.
+            spi_speed_hz -- the SPI clock. The RFM69 accepts up to 10MHz.
+            duty_cycle_budget -- the fraction of `duty_cycle_window` seconds we may
+                    spend transmitting (e.g. 0.01 for 1%), or None for no limit
+            capture   -- a `capture.CaptureWriter` which records every frame
+                    received and transmitted, or None
         """
         self.log = logging.getLogger(__name__)
+        self.backend = backend if backend is not None else HardwareBackend()
         self.reset_pin = reset_pin
         self.dio0_pin = dio0_pin
         self.spi_channel = spi_channel
+        self.spi_device = spi_device
+        self.spi_speed_hz = spi_speed_hz
         self.config = config
+        self.capture = capture
         self.rx_restarts = 0
+        # SPI transactions come from both the caller and the DIO0 interrupt thread
+        self.spi_lock = RLock()
+
+        # Last known values of the non-volatile registers, and how many SPI
+        # transactions were issued and avoided thanks to it.
+        self.shadow = {}
+        self.spi_transactions = 0
+        self.spi_saved = 0
+
+        # Receive engine state. Frames are pushed by the DIO0 interrupt and
+        # drained by consumers; when the buffer is full the oldest frame is lost.
+        self.rx_buffer = deque(maxlen=rx_buffer_size)
+        self.rx_available = Condition()
+        self.rx_frames = 0
+        self.rx_overflows = 0
+        self.receiving = False
+
+        # Transmit completion is signalled on DIO0 (PacketSent) while the
+        # receive engine has edge detection armed.
+        self.packet_sent_event = Event()
+        self.tx_latency = Histogram()
+        self.tx_interrupts = 0
+        self.tx_polled = 0
+        self.duty_cycle = DutyCycleMonitor(window=duty_cycle_window, budget=duty_cycle_budget)
+
         self.init_gpio()
         self.init_spi()
         self.reset()
@@ -54,104 +133,207 @@ class RFM69(object):
         self.log.info("Initialised successfully")
 
         ##==========##
-        self.packet_ready_event = Event()
         self.wrt_event = Event()
 
     def init_gpio(self):
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
-        GPIO.setup(self.dio0_pin, GPIO.IN)
+        self.backend.setup_input(self.dio0_pin)
 
     def init_spi(self):
-        self.spi = spidev.SpiDev()
-        self.spi.open(self.spi_channel, 0)
-        self.spi.bits_per_word = 8
-        self.spi.max_speed_hz = 50000
+        self.spi = self.backend.open_spi(self.spi_channel, self.spi_speed_hz, self.spi_device)
 
     def reset(self):
         """ Reset the module, then check it's working. """
         self.log.debug("Initialising RFM...")
-        GPIO.setup(self.reset_pin, GPIO.OUT)
-        GPIO.output(self.reset_pin, 1)
-        sleep(0.05)
-        GPIO.setup(self.reset_pin, GPIO.IN)
-        sleep(0.05)
+        with self.spi_lock:
+            self.shadow.clear()
+            self.backend.pulse_reset(self.reset_pin, self.RESET_HOLD, self.RESET_SETTLE)
         if (self.spi_read(Register.VERSION) != 0x24):
             raise RadioError("Failed to initialise RFM69")
 
-    def payload_ready_interrupt(self, pin):
-        self.log.debug("Payload Ready Interrupt")
-        self.packet_ready_event.set()
-
-    def write_config(self):
+    def write_config(self, verify=False):
         """ Write the full configuration to the module. This is called on
             initialisation.
-        """
-        self.log.debug("Writing configuration...")
-        count = 0
-        for register, value in self.config.get_registers().items():
-            self.spi_write(register, value)
-            count += 1
 
-        self.log.debug("%s configuration registers written.", count)
+            Runs of consecutive registers are written in a single SPI transaction,
+            relying on the module's address auto-increment.
 
-    def read_with_cb(self, timeout=None):
+            verify -- read the registers back afterwards. Returns the differences
+                    as a dict of {register: (written, read)}, which is empty when
+                    everything matched.
         """
-            3378
+        self.log.debug("Writing configuration...")
+        registers = self.config.get_registers()
+        transactions = 0
+        for start, values in self.register_bursts(registers):
+            self.spi_burst_write(start, values)
+            transactions += 1
+
+        self.log.debug("%s configuration registers written in %s transactions.",
+                       len(registers), transactions)
+        if verify:
+            return self.verify_config(registers)
+
+    def verify_config(self, registers=None):
+        """ Read back the configuration registers and compare them with the values
+            which should have been written. Returns a dict of
+            {register: (expected, actual)} for every register which differs.
         """
-        start = time()
-
-        self.rx_restarts = 0
-        GPIO.add_event_detect(self.dio0_pin, GPIO.RISING, callback=self.payload_ready_interrupt)
-        self.set_mode(OpMode.RX)
-        packet_received = False
-        self.log.info("Start reading")
-
-        while True:
-            if self.wrt_event.is_set():
-                self.log.info("Write event is set. Stop receiving.")
-                break
-
-            irqflags = self.read_register(IRQFlags1)
-            if not irqflags.mode_ready:
-                self.log.error("Module out of ready state: %s", irqflags)
-                break
-            if irqflags.rx_ready and irqflags.timeout:
-                # Once the RFM's receiver has been started by a signal over the RSSI
-                # threshold, it will continue running (possibly with stale AGC/AFC
-                # parameters). Detect this and reset the receiver.
-                irqflags2 = self.read_register(IRQFlags2)
-                # self.log.debug("Restarting Rx on timeout. RSSI: %s, sync: %s, fifo_not_empty: %s, crc: %s",
-                #                irqflags.rssi, irqflags.sync_address_match, irqflags2.fifo_not_empty,
-                #                irqflags2.crc_ok)
-                self.spi_write(Register.PACKETCONFIG2,
-                               self.spi_read(Register.PACKETCONFIG2) | RF.PACKET2_RXRESTART)
-                self.rx_restarts += 1
-            if timeout is not None and time() - start > timeout:
-                break
-            if self.packet_ready_event.wait(1):
-                packet_received = True
-                break
-
-        GPIO.remove_event_detect(self.dio0_pin)
-        self.set_mode(OpMode.Standby, wait=False)
-        self.packet_ready_event.clear()
-
-        if packet_received:
+        if registers is None:
+            registers = self.config.get_registers()
+
+        diff = {}
+        for start, values in self.register_bursts(registers):
+            actual = self.spi_burst_read(start, len(values))
+            for offset, (expected, value) in enumerate(zip(values, actual)):
+                register = start + offset
+                mask = self.VERIFY_MASKS.get(register, 0xFF)
+                if expected & mask != value & mask:
+                    diff[register] = (expected, value)
+
+        for register, (expected, value) in sorted(diff.items()):
+            try:
+                name = Register(register).name
+            except ValueError:
+                name = hex(register)
+            self.log.warning("Register %s: wrote %#04x, read back %#04x", name, expected, value)
+        return diff
+
+    @staticmethod
+    def register_bursts(registers):
+        """ Group a {register: value} mapping into runs of consecutive addresses.
+            Returns a list of (first register, [values]). The FIFO is never part
+            of a run, as it doesn't auto-increment.
+        """
+        bursts = []
+        for register in sorted(registers):
+            value = registers[register] & 0xFF
+            if bursts and register != Register.FIFO and \
+                    bursts[-1][0] != Register.FIFO and \
+                    bursts[-1][0] + len(bursts[-1][1]) == register:
+                bursts[-1][1].append(value)
+            else:
+                bursts.append((register, [value]))
+        return bursts
+
+    def start_receiving(self):
+        """ Start the persistent receive engine.
+
+            The radio is put in RX and DIO0 edge detection is armed once. Every
+            PayloadReady interrupt reads the frame out of the FIFO and pushes it to
+            `rx_buffer`; the radio restarts reception by itself (AutoRxRestartOn), so
+            nothing has to be re-armed between packets.
+        """
+        if self.receiving:
+            return
+        with self.spi_lock:
+            self.set_mode(OpMode.RX)
+            self.backend.add_event_detect(self.dio0_pin, self.dio0_interrupt)
+            self.receiving = True
+        self.log.info("Receive engine started")
+
+    def stop_receiving(self):
+        """ Stop the receive engine and return the radio to standby.
+            Frames already in the buffer are kept.
+        """
+        if not self.receiving:
+            return
+        with self.spi_lock:
+            self.backend.remove_event_detect(self.dio0_pin)
+            self.receiving = False
+            self.set_mode(OpMode.Standby, wait=False)
+        self.log.info("Receive engine stopped")
+
+    def dio0_interrupt(self, pin):
+        """ DIO0 callback of the receive engine. Runs in the GPIO thread. """
+        if self.config.opmode.mode == OpMode.TX:
+            # PacketSent. send_packet holds the SPI lock while it waits for this.
+            self.packet_sent_event.set()
+            return
+
+        with self.spi_lock:
+            if self.config.opmode.mode != OpMode.RX:
+                return
+            if not self.read_register(IRQFlags2).payload_ready:
+                return
+            frame = self.read_fifo()
+
+        with self.rx_available:
+            self.rx_frames += 1
+            if len(self.rx_buffer) == self.rx_buffer.maxlen:
+                self.rx_overflows += 1
+                self.log.warning("Receive buffer full, dropping oldest frame")
+            self.rx_buffer.append(frame)
+            self.rx_available.notify()
+
+    def read_fifo(self):
+        """ Read the pending packet out of the FIFO.
+            Returns a tuple of (packet, rssi, received_at), where `received_at` is
+            the time() the PayloadReady interrupt was serviced: consumers use it
+            instead of the time they got around to the frame, which includes any
+            queueing in `rx_buffer`.
+        """
+        received_at = time()
+        with self.spi_lock:
             rssi = self.get_rssi()
             data_length = self.spi_read(Register.FIFO)
-            data = self.spi_burst_read(Register.FIFO, data_length)
+            # One copy from the transfer buffer; dropping the echoed length byte
+            # from the front of a bytearray doesn't move the rest
+            data = bytearray(self.spi_xfer([Register.FIFO] + [0] * data_length))
+            del data[0]
+        if self.capture is not None:
+            self.capture.write(RX, data, rssi, received_at)
+
+        self.log.info("Received message: %s, RSSI: %s", data, rssi)
+        return (data, rssi, received_at)
+
+    def get_frame(self, timeout=None, cancel_event=None):
+        """ Take the oldest frame from the receive buffer, waiting up to `timeout`
+            seconds for one to arrive. Returns a tuple of (packet, rssi, received_at),
+            or None.
+
+            cancel_event -- an Event which stops the wait early when set. It's
+                    checked once per second.
+        """
+        deadline = None if timeout is None else time() + timeout
+        with self.rx_available:
+            while not self.rx_buffer:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                remaining = 1 if deadline is None else min(1, deadline - time())
+                if remaining <= 0:
+                    return None
+                self.rx_available.wait(remaining)
+            return self.rx_buffer.popleft()
+
+    def drain(self):
+        """ Take every buffered frame at once. Returns a list of
+            (packet, rssi, received_at).
+        """
+        with self.rx_available:
+            frames = list(self.rx_buffer)
+            self.rx_buffer.clear()
+        return frames
+
+    def read_with_cb(self, timeout=None):
+        """ Receive a single packet through the receive engine.
 
-            self.log.info("Received message: %s, RSSI: %s", data, rssi)
-            return (bytearray(data), rssi)
-        else:
-            return None
+            Starts the engine if it isn't running yet and leaves it running, so
+            packets arriving between calls are buffered rather than lost.
+            Returns a tuple of (packet, rssi, received_at), or None if nothing arrived before
+            `timeout` or `wrt_event` was set.
+        """
+        self.start_receiving()
+        frame = self.get_frame(timeout, cancel_event=self.wrt_event)
+        if frame is None and self.wrt_event.is_set():
+            self.log.info("Write event is set. Stop receiving.")
+        return frame
 
-    def send_packet(self, data, preamble=None):
+    def send_packet(self, data, preamble=None, device=None):
         """ Transmit a packet. If you've configured the RFM to use variable-length
             packets, this function will add a length byte for you.
 
-            The radio will be returned to the standby state.
+            The radio will be returned to the standby state, or to RX if the
+            receive engine is running.
 
             data -- this should be a bytearray. If it isn't, we'll try and convert it,
                     but you might end up with encoding issues, especially if you use
@@ -159,79 +341,91 @@ class RFM69(object):
             preamble -- how long, in seconds, to send the preamble bytes for. Longer
                     preambles may result in more reliable decoding, at the expense of
                     spectrum use.
+            device -- the device the airtime is accounted to. Defaults to the
+                    first (destination) byte of the packet.
+
+            Raises DutyCycleExceeded, without transmitting, if the packet would go
+            over the duty-cycle budget.
         """
-        data = list(bytearray(data))
+        data = packet = list(bytearray(data))
+        if device is None and data:
+            device = data[0]
+        airtime = self.packet_airtime(len(data)) + (preamble or 0)
+        self.duty_cycle.check(airtime)
 
         if self.config.packet_config_1.variable_length:
             self.log.debug("Adding data legth byte")
             data = [len(data)] + list(data)
 
-        self.log.debug("Initialising Tx...")
-        start = time()
-        self.set_mode(OpMode.TX, wait=False)
-        wait_for(lambda: self.read_register(IRQFlags1).tx_ready)
+        with self.spi_lock:
+            self.log.debug("Initialising Tx...")
+            start = time()
+            # DIO0 -> PacketSent while transmitting
+            self.spi_write(Register.DIOMAPPING1,
+                           (self.config.dio_mapping_1 & 0x3F) | RF.DIOMAPPING1_DIO0_00)
+            self.set_mode(OpMode.TX, wait=False)
+            wait_for(lambda: self.read_register(IRQFlags1).tx_ready)
+
+            self.log.debug("In Tx mode (took %.3fs)", time() - start)
+
+            if preamble:
+                sleep(preamble)
+
+            self.packet_sent_event.clear()
+            self.write_fifo(data)
+            try:
+                self.wait_packet_sent()
+                self.tx_latency.add(time() - start)
+                self.duty_cycle.record(device, airtime)
+                if self.capture is not None:
+                    self.capture.write(TX, bytearray(packet))
+            except RadioError:
+                self.log.error("Packet haven't been sent. Sorry")
+
+            # Hand the radio back to the receive engine if it's running
+            self.spi_write(Register.DIOMAPPING1, self.config.dio_mapping_1)
+            self.set_mode(OpMode.RX if self.receiving else OpMode.Standby)
+        self.log.debug("Packet (%r) sent in %.3fs", data, time() - start)
 
-        self.log.debug("In Tx mode (took %.3fs)", time() - start)
+    def wait_packet_sent(self):
+        """ Wait for the packet in the FIFO to go out.
 
-        if preamble:
-            sleep(preamble)
+            With the receive engine running DIO0 is armed, and PacketSent is taken
+            from the interrupt, confirmed by a single read of IRQFlags2. Otherwise,
+            or if the interrupt doesn't come, IRQFlags2 is polled with wait_for.
+        """
+        if self.receiving and self.packet_sent_event.wait(self.PACKET_SENT_TIMEOUT):
+            if self.read_register(IRQFlags2).packet_sent:
+                self.tx_interrupts += 1
+                return
+        wait_for(lambda: self.read_register(IRQFlags2).packet_sent)
+        self.tx_polled += 1
 
-        self.write_fifo(data)
-        try:
-            wait_for(lambda: self.read_register(IRQFlags2).packet_sent)
-        except RadioError:
-            self.log.error("Packet haven't been sent. Sorry")
+    def packet_airtime(self, payload_length):
+        """ Time on air, in seconds, of a packet with this much payload. """
+        return packet_airtime(self.config, payload_length)
 
-        self.set_mode(OpMode.Standby)
-        self.log.debug("Packet (%r) sent in %.3fs", data, time() - start)
+    def get_airtime_stats(self):
+        """ Rolling airtime and duty cycle, overall and per device. """
+        return self.duty_cycle.as_dict()
+
+    def get_tx_stats(self):
+        """ Transmit latency (TX request to PacketSent) and how completion was detected. """
+        stats = self.tx_latency.as_dict()
+        stats['interrupt'] = self.tx_interrupts
+        stats['polled'] = self.tx_polled
+        return stats
 
 
     def wait_for_packet(self, timeout=None):
         """ Put the module in receive mode, and block until we receive a packet.
-            Returns a tuple of (packet, rssi), or None if there was a timeout
+            Returns a tuple of (packet, rssi, received_at), or None if there was a timeout
 
             timeout -- the amount of time to wait for before returning if no
                        packets were received.
         """
-        start = time()
-        self.rx_restarts = 0
-        GPIO.add_event_detect(self.dio0_pin, GPIO.RISING, callback=self.payload_ready_interrupt)
-        self.set_mode(OpMode.RX)
-        packet_received = False
-        while True:
-            irqflags = self.read_register(IRQFlags1)
-            if not irqflags.mode_ready:
-                self.log.error("Module out of ready state: %s", irqflags)
-                break
-            if irqflags.rx_ready and irqflags.timeout:
-                # Once the RFM's receiver has been started by a signal over the RSSI
-                # threshold, it will continue running (possibly with stale AGC/AFC
-                # parameters). Detect this and reset the receiver.
-                irqflags2 = self.read_register(IRQFlags2)
-                # self.log.debug("Restarting Rx on timeout. RSSI: %s, sync: %s, fifo_not_empty: %s, crc: %s",
-                #                irqflags.rssi, irqflags.sync_address_match, irqflags2.fifo_not_empty,
-                #                irqflags2.crc_ok)
-                self.spi_write(Register.PACKETCONFIG2,
-                               self.spi_read(Register.PACKETCONFIG2) | RF.PACKET2_RXRESTART)
-                self.rx_restarts += 1
-            if timeout is not None and time() - start > timeout:
-                break
-            if self.packet_ready_event.wait(1):
-                packet_received = True
-                break
-
-        GPIO.remove_event_detect(self.dio0_pin)
-        self.set_mode(OpMode.Standby, wait=False)
-
-        if packet_received:
-            rssi = self.get_rssi()
-            data_length = self.spi_read(Register.FIFO)
-            data = self.spi_burst_read(Register.FIFO, data_length)
-
-            self.log.info("Received message: %s, RSSI: %s", data, rssi)
-            return (bytearray(data), rssi)
-        else:
-            return None
+        self.start_receiving()
+        return self.get_frame(timeout)
 
     def set_mode(self, mode, wait=True):
         """ Change the mode of the radio. Mode values can be found in the OpMode class.
@@ -241,7 +435,9 @@ class RFM69(object):
         """
         start = time()
         self.config.opmode.mode = mode
-        self.write_register(self.config.opmode)
+        if not self.write_register(self.config.opmode):
+            # Already in this mode
+            return
         while wait:
             irqflags = self.read_register(IRQFlags1)
             if irqflags.mode_ready:
@@ -315,22 +511,61 @@ class RFM69(object):
         return register_cls.unpack(resp)
 
     def write_register(self, register):
-        self.spi_write(register.REGISTER, register.pack())
+        """ Write a RegisterValue. Returns False if the module already held it. """
+        return self.spi_write(register.REGISTER, register.pack())
+
+    def get_spi_stats(self):
+        """ SPI transaction counters for monitoring. """
+        return {
+            'transactions': self.spi_transactions,
+            'saved': self.spi_saved,
+        }
+
+    def spi_xfer(self, data):
+        with self.spi_lock:
+            self.spi_transactions += 1
+            return self.spi.xfer2(data)
 
     def spi_read(self, register):
-        data = [register & ~0x80, 0]
-        resp = self.spi.xfer2(data)
-        return resp[1]
+        """ Read a register, from the shadow if it's non-volatile and known. """
+        with self.spi_lock:
+            if register in self.shadow:
+                self.spi_saved += 1
+                return self.shadow[register]
+            value = self.spi_xfer([register & ~0x80, 0])[1]
+            if register not in self.VOLATILE_REGISTERS:
+                self.shadow[register] = value
+            return value
 
     def spi_burst_read(self, register, length):
         data = [register & ~0x80] + ([0] * (length))
         # We get the length again as the first character of the buffer
-        return self.spi.xfer2(data)[1:]
+        return self.spi_xfer(data)[1:]
 
     def spi_write(self, register, value):
-        data = [register | 0x80, value]
-        self.spi.xfer2(data)
+        """ Write a register, unless the shadow says it already holds `value`.
+            Returns True if a transaction was issued.
+        """
+        value &= 0xFF
+        with self.spi_lock:
+            if register not in self.VOLATILE_REGISTERS:
+                stored = value & ~self.TRIGGER_BITS.get(register, 0)
+                if stored == value and self.shadow.get(register) == value:
+                    self.spi_saved += 1
+                    return False
+                self.shadow[register] = stored
+            self.spi_xfer([register | 0x80, value])
+            return True
+
+    def spi_burst_write(self, register, values):
+        values = [value & 0xFF for value in values]
+        with self.spi_lock:
+            self.spi_xfer([register | 0x80] + values)
+            for offset, value in enumerate(values):
+                address = register + offset
+                if address not in self.VOLATILE_REGISTERS:
+                    self.shadow[address] = value & ~self.TRIGGER_BITS.get(address, 0)
 
     def write_fifo(self, data):
         self.log.debug("Data is %s", data)
-        self.spi.xfer2([Register.FIFO | 0x80] + data)
+        self.spi_xfer([Register.FIFO | 0x80] + data)
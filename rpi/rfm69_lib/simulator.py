@@ -0,0 +1,295 @@
+import random
+import threading
+from collections import deque
+from time import sleep, time
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+from .configuration import OpMode
+from .constants import Register, RF
+
+
+class SimulatedBackend(object):
+    """ An in-memory register-file model of the RFM69, usable in place of
+        `HardwareBackend`.
+
+        It models enough of the module for the driver to run unmodified: the
+        register file with burst auto-increment, OpMode transitions and the
+        IRQFlags1/IRQFlags2 bits that follow them, the FIFO in both directions and
+        the DIO0 interrupt (PacketSent in TX, CrcOk/PayloadReady in RX). Interrupt
+        callbacks are delivered from a separate thread, like RPi.GPIO does.
+
+        Packets "on air" are added with `inject`. A packet which arrives while the
+        radio isn't in RX or the previous one hasn't been read out yet is lost,
+        as it would be on the real module.
+    """
+    def __init__(self, noise_floor=-110, noise_spread=3, ack_handler=None):
+        """ noise_floor  -- the RSSI in dBm reported while no packet is being received
+            noise_spread -- the noise samples are spread uniformly by +/- this many dB
+            ack_handler  -- called with every transmitted packet; may return a list of
+                    (payload, rssi, delay) tuples which are injected as replies
+        """
+        self.noise_floor = noise_floor
+        self.noise_spread = noise_spread
+        self.ack_handler = ack_handler
+        self.max_speed_hz = None
+
+        self.lock = threading.RLock()
+        self.callbacks = {}
+        self.transmitted = deque(maxlen=1000)
+
+        # Counters
+        self.transactions = 0
+        self.injected = 0
+        self.lost = 0
+        self.sent = 0
+        self.rx_restarts = 0
+
+        self.power_on()
+
+        self._irq_queue = Queue()
+        self._irq_thread = threading.Thread(name='sim-irq', target=self._irq_worker)
+        self._irq_thread.daemon = True
+        self._irq_thread.start()
+
+    def power_on(self):
+        """ Put the register file back in its power-on state. """
+        with self.lock:
+            self.registers = bytearray(0x80)
+            self.registers[Register.OPMODE] = 0x04
+            self.registers[Register.VERSION] = 0x24
+            self.registers[Register.RSSICONFIG] = RF.RSSI_DONE
+            self.registers[Register.IRQFLAGS1] = RF.IRQFLAGS1_MODEREADY
+            self.registers[Register.TEMP2] = 168 - 25
+            self.mode = OpMode.Standby
+            self.fifo = deque()
+            self.tx_buffer = []
+
+    # Backend interface #
+
+    def setup_input(self, pin):
+        pass
+
+    def pulse_reset(self, pin, hold=0.05, settle=0.05):
+        self.power_on()
+
+    def add_event_detect(self, pin, callback):
+        self.callbacks[pin] = callback
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def open_spi(self, channel, max_speed_hz, device=0):
+        self.max_speed_hz = max_speed_hz
+        return self
+
+    def xfer2(self, data):
+        with self.lock:
+            self.transactions += 1
+            address = data[0] & 0x7F
+            if data[0] & 0x80:
+                self._write(address, data[1:])
+                return [0] * len(data)
+            return [0] + self._read(address, len(data) - 1)
+
+    # Air interface #
+
+    def inject(self, payload, rssi=-60):
+        """ Put a packet on air. Returns False if the radio missed it. """
+        payload = bytearray(payload)
+        with self.lock:
+            self.injected += 1
+            flags2 = self.registers[Register.IRQFLAGS2]
+            if self.mode != OpMode.RX or flags2 & RF.IRQFLAGS2_PAYLOADREADY:
+                self.lost += 1
+                return False
+            self.fifo.extend([len(payload)] + list(payload))
+            self.registers[Register.RSSIVALUE] = self._rssi_byte(rssi)
+            self.registers[Register.IRQFLAGS2] = flags2 | RF.IRQFLAGS2_PAYLOADREADY | \
+                RF.IRQFLAGS2_CRCOK | RF.IRQFLAGS2_FIFONOTEMPTY
+        self._raise_dio0()
+        return True
+
+    # Register file #
+
+    def _write(self, address, values):
+        if address == Register.FIFO:
+            self._write_fifo(values)
+            return
+        for value in values:
+            self._write_register(address, value)
+            address = (address + 1) & 0x7F
+
+    def _write_register(self, address, value):
+        value &= 0xFF
+        if address in (Register.VERSION, Register.IRQFLAGS1, Register.IRQFLAGS2,
+                       Register.RSSIVALUE, Register.TEMP2):
+            return
+        if address == Register.PACKETCONFIG2 and value & RF.PACKET2_RXRESTART:
+            self.rx_restarts += 1
+            value &= ~RF.PACKET2_RXRESTART
+        if address == Register.OPMODE:
+            value &= ~RF.OPMODE_LISTENABORT
+        self.registers[address] = value
+        if address == Register.OPMODE:
+            self._set_mode((value >> 2) & 0x7)
+
+    def _set_mode(self, mode):
+        flags1 = RF.IRQFLAGS1_MODEREADY
+        flags2 = self.registers[Register.IRQFLAGS2]
+        if mode == OpMode.RX:
+            flags1 |= RF.IRQFLAGS1_RXREADY
+        elif mode == OpMode.TX:
+            flags1 |= RF.IRQFLAGS1_TXREADY
+            # The FIFO is emptied going into TX
+            self.fifo.clear()
+            self.tx_buffer = []
+            flags2 &= ~(RF.IRQFLAGS2_PAYLOADREADY | RF.IRQFLAGS2_CRCOK | RF.IRQFLAGS2_FIFONOTEMPTY)
+        if mode != OpMode.TX:
+            flags2 &= ~RF.IRQFLAGS2_PACKETSENT
+        self.registers[Register.IRQFLAGS1] = flags1
+        self.registers[Register.IRQFLAGS2] = flags2
+        self.mode = mode
+
+    def _read(self, address, length):
+        if address == Register.FIFO:
+            out = [self.fifo.popleft() if self.fifo else 0 for _ in range(length)]
+            if not self.fifo:
+                self.registers[Register.IRQFLAGS2] &= ~(RF.IRQFLAGS2_PAYLOADREADY | RF.IRQFLAGS2_CRCOK |
+                                                        RF.IRQFLAGS2_FIFONOTEMPTY)
+            return out
+        out = []
+        for _ in range(length):
+            if address == Register.RSSIVALUE and not self.fifo:
+                self.registers[address] = self._rssi_byte(
+                    self.noise_floor + random.uniform(-self.noise_spread, self.noise_spread))
+            out.append(self.registers[address])
+            address = (address + 1) & 0x7F
+        return out
+
+    def _write_fifo(self, values):
+        if self.mode != OpMode.TX:
+            self.fifo.extend(values)
+            return
+        self.tx_buffer.extend(values)
+        if len(self.tx_buffer) < self.tx_buffer[0] + 1:
+            return
+        packet = bytearray(self.tx_buffer[1:self.tx_buffer[0] + 1])
+        self.tx_buffer = []
+        self.sent += 1
+        self.transmitted.append((time(), packet))
+        self.registers[Register.IRQFLAGS2] |= RF.IRQFLAGS2_PACKETSENT
+        self._raise_dio0()
+        if self.ack_handler is not None:
+            for payload, rssi, delay in self.ack_handler(packet) or ():
+                timer = threading.Timer(delay, self.inject, (payload, rssi))
+                timer.daemon = True
+                timer.start()
+
+    @staticmethod
+    def _rssi_byte(rssi):
+        return max(0, min(255, int(-rssi * 2)))
+
+    # Interrupts #
+
+    def _raise_dio0(self):
+        """ Queue a DIO0 edge if the current mapping routes the event to DIO0. """
+        mapping = self.registers[Register.DIOMAPPING1] >> 6
+        if self.mode == OpMode.TX and mapping != 0b00:
+            return
+        if self.mode == OpMode.RX and mapping not in (0b00, 0b01):
+            return
+        self._irq_queue.put(None)
+
+    def _irq_worker(self):
+        while True:
+            self._irq_queue.get()
+            for pin, callback in list(self.callbacks.items()):
+                callback(pin)
+
+
+class TrafficGenerator(object):
+    """ Injects frames from a population of simulated nodes at a fixed aggregate
+        rate, and measures the latency of the frames which make it to a consumer.
+    """
+    def __init__(self, backend, node_ids, rate, make_frame=None, rssi=(-90, -50)):
+        """ backend    -- the `SimulatedBackend` to inject into
+            node_ids   -- radio ids of the simulated nodes; they send in turn
+            rate       -- frames per second, over all nodes
+            make_frame -- called as make_frame(node_id, seq); defaults to a
+                    temperature frame
+            rssi       -- (min, max) dBm range the frames are received with
+        """
+        self.backend = backend
+        self.node_ids = list(node_ids)
+        self.rate = rate
+        self.make_frame = make_frame or self.temperature_frame
+        self.rssi = rssi
+
+        self.sent_at = {}
+        self.latencies = []
+        self.generated = 0
+        self._running = False
+        self._thread = None
+
+    @staticmethod
+    def temperature_frame(node_id, seq):
+        value = 200 + seq % 100
+        return bytearray([0, node_id, 0, seq, 170, value & 0xFF, value >> 8, 0, 0])
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(name='sim-traffic', target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        next_time = time()
+        seqs = {}
+        while self._running:
+            node_id = self.node_ids[self.generated % len(self.node_ids)]
+            seq = seqs[node_id] = (seqs.get(node_id, -1) + 1) & 0xFF
+            self.sent_at[(node_id, seq)] = time()
+            if not self.backend.inject(self.make_frame(node_id, seq), random.uniform(*self.rssi)):
+                # Lost on air: the consumer will never see it
+                del self.sent_at[(node_id, seq)]
+            self.generated += 1
+
+            next_time += interval
+            delay = next_time - time()
+            if delay > 0:
+                sleep(delay)
+
+    def received(self, frame):
+        """ Record the arrival of a frame at the consumer. """
+        sent = self.sent_at.pop((frame[1], frame[3]), None)
+        if sent is not None:
+            self.latencies.append(time() - sent)
+
+    def report(self, duration):
+        """ A dict summarising throughput, loss and latency over `duration` seconds. """
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        return {
+            'generated': self.generated,
+            'lost_on_air': self.backend.lost,
+            'consumed': len(latencies),
+            'throughput': len(latencies) / duration,
+            'latency_p50': percentile(0.5),
+            'latency_p99': percentile(0.99),
+            'latency_max': latencies[-1] if latencies else None,
+        }
@@ -0,0 +1,69 @@
+from bisect import bisect_left
+from threading import Lock
+
+
+# Upper bounds (seconds) of the default latency buckets
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30)
+
+
+class Histogram(object):
+    """ A fixed-bucket histogram of durations, cheap enough to update on every packet.
+
+        bounds -- ascending upper bounds of the buckets. Values above the last bound
+                  go into an overflow bucket.
+    """
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.min = None
+            self.max = None
+
+    def add(self, value):
+        with self.lock:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentile(self, p):
+        """ Upper bound of the bucket holding the p-th percentile (0 < p <= 1).
+            Returns None when empty, and `max` for the overflow bucket.
+        """
+        with self.lock:
+            if not self.count:
+                return None
+            rank = p * self.count
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return self.bounds[i] if i < len(self.bounds) else self.max
+            return self.max
+
+    def as_dict(self):
+        """ Summary suitable for logging or returning as JSON. """
+        buckets = {}
+        with self.lock:
+            for bound, count in zip(self.bounds + ('inf',), self.counts):
+                if count:
+                    buckets[str(bound)] = count
+            summary = {
+                'count': self.count,
+                'mean': self.total / self.count if self.count else None,
+                'min': self.min,
+                'max': self.max,
+                'buckets': buckets,
+            }
+        summary['p50'] = self.percentile(0.5)
+        summary['p99'] = self.percentile(0.99)
+        return summary
@@ -2,7 +2,6 @@
 # -*- coding: utf8 -*-
 # Author: Antipin S.O. @RLDA
 
-import threading
 from time import sleep, time
 
 from .sencors import *
@@ -11,8 +10,22 @@ from .firebase import fireBase
 from . import sql
 from .rfm69_lib.rfm69 import RFM69 as rfm69
 from .rfm69_lib.configuration import RFM69Configuration as rfm_config
+from .rfm69_lib.noise import NoiseFloorTracker
+from .rfm69_lib.capture import CaptureWriter
+from .radio import RadioScheduler
+from .link_stats import LinkTable
+from .node_index import NodeIndex
+from .tasks import TaskScheduler
+from .cmd_queue import CommandQueue
+from .conditioner import ConditionerDelivery
+from .beacon import BeaconPredictor
+from .retry import RetryPolicy
+from .timeouts import TimeoutHeap
+from .frame import parse_header, FrameError
+from .dedup import SequenceTracker
 from .sencor_logging import Warden
 
+import threading
 import logging
 log = logging.getLogger(__name__)
 
@@ -39,7 +52,33 @@ class Group(object):
 @singleton
 class rpiHub(object):
     """ Класс-одиночка хаба Raspberry """
-    def __init__(self):
+    # Приоритеты команд по типу устройства (меньше - раньше): команды
+    # кондиционеру ждут маяка до 40 сек и не должны задерживать реле
+    CMD_PRIORITY = {'Conditioner': 1}
+    # Время жизни команды в очереди, сек
+    CMD_DEADLINE = 120
+    # Запас ожидания ответа на команду на очередь передачи, сек
+    TX_MARGIN = 5
+    # Период отправки обновленных показаний датчиков в облако, сек
+    SENCORS_PUSH_INTERVAL = 2
+    # Радиомодули: SPI-шина и chip-select, пины GPIO, частотный канал,
+    # необязательные 'capture' - файл записи всех кадров модуля,
+    # 'duty_cycle_budget' - доля эфирного времени на передачу (0.01 - 1%,
+    # по умолчанию без ограничения) за 'duty_cycle_window' сек (3600)
+    RADIOS = (
+        {'spi_channel': 0, 'spi_device': 0, 'dio0_pin': 24, 'reset_pin': 22,
+         'chan_num': 2},
+    )
+
+    def __init__(self, radio_backend=None, radios=None):
+        """
+            @param: radio_backend - бэкенд SPI/GPIO для радиомодуля
+                    (None - реальное железо, SimulatedBackend - симулятор),
+                    для нескольких модулей - список бэкендов по одному на
+                    модуль или фабрика, вызываемая для каждого модуля
+                    (например, класс SimulatedBackend)
+            @param: radios - настройки радиомодулей (по умолчанию RADIOS)
+        """
         # Средства работы с Google Firebase
         self.firebase = fireBase()
         # Список групп устройств
@@ -48,23 +87,103 @@ class rpiHub(object):
         self.snc_list = []
         # Список устройств
         self.dvc_list = []
-        self.cmd_queue = []
+        # Индексы групп, датчиков и устройств для поиска за O(1)
+        self.index = NodeIndex()
+        # Крайние сроки ответа датчиков
+        self.timeouts = TimeoutHeap()
+        # Очередь управляющих команд (одна ожидающая команда на устройство)
+        self.cmd_queue = CommandQueue(on_expire=self.cmd_expired)
+        # Доставляемые команды контроллерам кондиционеров по id устройства
+        self.conditioners = {}
+        # Предсказание окон приема контроллеров по id устройства
+        self.beacons = {}
+        # Политика повторов команд реле
+        self.retry = RetryPolicy()
+        # Служебные задачи, каждая в своем потоке со своим периодом:
+        # медленный запрос в облако не задерживает отправку команд
+        self.tasks = TaskScheduler()
+        # Отправка команд из очереди (сразу по появлению команды)
+        self.tasks.add('cmd', self.write, interval=30, evented=True)
+        # Проверка и обновление токена доступа Firebase
+        self.tasks.add('token', self.update_token, interval=30)
+        # Проверка датчиков на таймаут ответа: к ближайшему крайнему сроку,
+        # но не реже раза в 30 сек
+        self.tasks.add('timeouts', self.check_sencors_timeouts, interval=30,
+                       next_due=self.timeouts.next_deadline)
+        # Отправка обновленных показаний датчиков в облако одним запросом
+        # (поток радиоканала только отмечает датчики)
+        self.tasks.add('sencors', self.push_sencors,
+                       interval=self.SENCORS_PUSH_INTERVAL, evented=True)
+        # Отметка времени последнего сообщения в облаке
+        self.tasks.add('cloud', self.firebase.update_time, interval=30)
+        # Таблица качества радиоканала по узлам
+        self.link_stats = LinkTable()
+        # Подавление повторов кадров датчиков и учет пропусков
+        self.sequences = SequenceTracker()
+        # Кадры из потоков всех радиомодулей обрабатываются по одному
+        self.read_lock = threading.Lock()
+        # Датчики с изменившимися данными, еще не отправленными в облако
+        self.dirty_sencors = {}
+        self.dirty_lock = threading.Lock()
+        # Id узла -> номер радиомодуля, через который он доступен
+        # (обновляется по принятым кадрам)
+        self.node_radio = {}
+        # Id узла -> радиомодуль, закрепленный вручную (assign_radio);
+        # автоматическая привязка по кадрам его не меняет
+        self.pinned_radio = {}
         # TODO: add get devices from db
         self.restore_settings_from_db()
-        # rfm69hw module
-        __config = rfm_config(chan_num=2)
-        self.rfm = rfm69(dio0_pin=24,
-                         reset_pin=22,
-                         spi_channel=0,
-                         config=__config)
-        self.rfm.set_rssi_threshold(-114)
+        # rfm69hw modules, каждый со своим планировщиком радиоканала
+        __radios = radios if radios is not None else self.RADIOS
+        # Бэкенд держит SPI и обработчик прерываний DIO0 своего модуля,
+        # поэтому у каждого модуля - собственный
+        if isinstance(radio_backend, (list, tuple)):
+            __backends = list(radio_backend)
+        elif radio_backend is None:
+            __backends = [None] * len(__radios)
+        elif callable(radio_backend):
+            __backends = [radio_backend() for __settings in __radios]
+        else:
+            __backends = [radio_backend]
+        if len(__backends) != len(__radios):
+            raise ValueError("%d radio backends for %d radios" % (
+                len(__backends), len(__radios)))
+        self.radios = []
+        for __number, __settings in enumerate(__radios):
+            __rfm = rfm69(dio0_pin=__settings['dio0_pin'],
+                          reset_pin=__settings['reset_pin'],
+                          spi_channel=__settings['spi_channel'],
+                          spi_device=__settings.get('spi_device', 0),
+                          config=rfm_config(chan_num=__settings['chan_num']),
+                          backend=__backends[__number],
+                          duty_cycle_budget=__settings.get(
+                              'duty_cycle_budget'),
+                          duty_cycle_window=__settings.get(
+                              'duty_cycle_window', 3600))
+            # Запись кадров для воспроизведения без железа
+            if __settings.get('capture'):
+                __rfm.capture = CaptureWriter(__settings['capture'])
+            # Начальный порог RSSI, далее подстраивается под уровень шума
+            __rfm.set_rssi_threshold(-114)
+            # Планировщик радиоканала: прием кадров и передача команд
+            self.radios.append(RadioScheduler(
+                __rfm, frame_handler=self.dispatch_frame,
+                noise_tracker=NoiseFloorTracker(__rfm),
+                frame_observer=(lambda frame, number=__number:
+                                self.observe_frame(number, frame))))
+        # Основной радиомодуль: для узлов, от которых еще не было кадров
+        self.radio = self.radios[0]
+        self.rfm = self.radio.rfm
         # Инициализировать объект-логгер показаний датчиков
         self.warden = Warden(update_fb_fn=self.firebase.update_stats,
                              read_fb_fn=self.firebase.read_stats)
         # Инициализировать поток прослушки для статистики
         self.firebase.init_warden(handler=self.warden.stream_handler)
-        # Инициализировать поток прослушки радиоканала
-        self.init_read_sencors()
+        # Инициализировать потоки радиоканалов
+        for __radio in self.radios:
+            __radio.start()
+        # Инициализировать потоки служебных задач
+        self.tasks.start()
 
     # COMMON #
 
@@ -88,250 +207,304 @@ class rpiHub(object):
             self.add_group(raw_group[0])
 
         # 2: Инициализировать датчики
+        # NOTE: идентификаторы в БД уникальны, поэтому проверка на дубликаты
+        # не нужна, а данные в облако уходят одним запросом в конце
         __raw_sencors = sql.getSencorsSettings()
-        log.info(__raw_sencors)
+        log.info("Restoring %s sencors" % len(__raw_sencors))
+        __sencors = []
         for raw_snc in __raw_sencors:
-            self.add_snc(
-                snc_id=raw_snc[0],
-                snc_type=raw_snc[1],
-                snc_group=raw_snc[2],
-                snc_name=raw_snc[3],
-                restore=True
-            )
+            __new_sencor = self.make_snc(snc_type=raw_snc[1],
+                                         snc_id=raw_snc[0],
+                                         snc_group=raw_snc[2],
+                                         snc_name=raw_snc[3])
+            if __new_sencor is not None:
+                self.attach_snc(__new_sencor)
+                __sencors.append(__new_sencor)
 
         # 3: Инициализировать управляемые устройства
         __raw_devices = sql.getDevicesSettings()
-        log.info(__raw_devices)
+        log.info("Restoring %s devices" % len(__raw_devices))
+        __devices = []
         for raw_dvc in __raw_devices:
-            self.add_dvc(
-                dvc_id=raw_dvc[0],
-                dvc_type=raw_dvc[1],
-                dvc_group=raw_dvc[2],
-                dvc_name=raw_dvc[3],
-                ch0name=raw_dvc[4],
-                ch1name=raw_dvc[5],
-                last_val=raw_dvc[6],
-                restore=True
-            )
-
-    def loop(self):
-        """ Loop-worker для потока чтения/записи """
-        try:
-            while(True):
-                # Проверить, жив ли основной поток
-                assert(threading.main_thread().is_alive())
-                # Проверить таймаут токена и обновить его при необходимости
-                # TODO: set token-updater to diff thread with rLock
-                self.firebase.upd_token(self.group_list, self.device_handler)
-                # Если установлено событие отправки команд
-                if self.rfm.wrt_event.is_set():
-                    try:
-                        # Отправка
-                        self.write()
-                    except Exception as e:
-                        log.error("Error during command write")
-                        log.error(e)
-                else:
-                    try:
-                        # Чтение
-                        self.read()
-                    except Exception as e:
-                        log.error("Error during snc/dvc read")
-                        log.error(e)
-                # Проверка датчиков на таймаут ответа и обновление их данных
-                self.check_sencors_timeouts()
-                self.firebase.update_time()
-                log.info("===ITER===")
-        except Exception as e:
-            """Обработка непредвиденных исключений"""
-            log.exception("message")
-        finally:
-            """ Убить потоки чтения устройств для чистого выхода """
-            for group in self.group_list:
-                try:
-                    group.dvc_stream.close()
-                except AttributeError:
-                    # Обработка периодической ошибки аттрибута
-                    # библиотечная ошибка, не влияющая ни на что
-                    pass
-
-    def read(self):
-        """ Метод чтения радиоканала """
-        # Переменная для хранения экземпляра датчика
+            __new_device = self.make_dvc(dvc_type=raw_dvc[1],
+                                         dvc_id=raw_dvc[0],
+                                         dvc_group=raw_dvc[2],
+                                         dvc_name=raw_dvc[3],
+                                         ch0name=raw_dvc[4],
+                                         ch1name=raw_dvc[5],
+                                         last_val=raw_dvc[6])
+            if __new_device is not None:
+                self.attach_dvc(__new_device)
+                __devices.append(__new_device)
+
+        # 4: Обновить данные в облаке одним запросом
+        self.firebase.update_batch(sencors=__sencors, devices=__devices)
+
+    def stop(self):
+        """ Остановить потоки хаба для чистого выхода """
+        self.tasks.stop()
+        for __radio in self.radios:
+            __radio.stop()
+            if __radio.rfm.capture is not None:
+                __radio.rfm.capture.close()
+        # Убить потоки чтения устройств
+        for group in self.group_list:
+            try:
+                group.dvc_stream.close()
+            except AttributeError:
+                # Обработка периодической ошибки аттрибута
+                # библиотечная ошибка, не влияющая ни на что
+                pass
+
+    def update_token(self):
+        """ Проверить таймаут токена и обновить его при необходимости """
+        self.firebase.upd_token(self.group_list, self.device_handler)
+
+    def cmd_expired(self, cmd, device):
+        """ Обработчик команды, не отправленной до крайнего срока """
+        log.error("Command for %s expired in queue" % device.name)
+        device.rollback()
+        self.firebase.update_device_value(device)
+
+    def get_task_stats(self):
+        """ Метод получения статистики служебных задач и радиоканала """
+        __stats = self.tasks.get_stats()
+        __stats['radios'] = [__radio.get_stats() for __radio in self.radios]
+        __stats['cmd_queue'] = self.cmd_queue.get_stats()
+        __stats['retry'] = self.retry.get_stats()
+        __stats['sequences'] = self.sequences.get_stats()
+        return __stats
+
+    def get_radio_stats(self):
+        """ Метод получения статистики и привязки узлов радиомодулей """
+        return {
+            'radios': [__radio.get_stats() for __radio in self.radios],
+            'nodes': dict(self.node_radio),
+            'pinned': dict(self.pinned_radio),
+        }
+
+    def observe_frame(self, number, frame):
+        """
+            Наблюдатель всех кадров радиомодуля number: качество канала и
+            привязка узла к радиомодулю, через который он слышен
+        """
+        self.link_stats.observe(frame)
+        if len(frame[0]) > 1:
+            self.node_radio[frame[0][1]] = number
+
+    def radio_for(self, node_id):
+        """ Планировщик радиоканала, через который доступен узел """
+        __number = self.pinned_radio.get(node_id)
+        if __number is None:
+            __number = self.node_radio.get(node_id, 0)
+        return self.radios[__number]
+
+    def assign_radio(self, node_id, number):
+        """ Закрепить узел за радиомодулем number """
+        if not 0 <= number < len(self.radios):
+            log.error("Radio %s does not exist" % number)
+            return "FAIL"
+        self.pinned_radio[node_id] = number
+        return "OK"
+
+    def dispatch_frame(self, income):
+        """ Общий обработчик кадров всех радиомодулей """
+        with self.read_lock:
+            self.read(income)
+
+    def read(self, income):
+        """
+            Метод обработки кадра из радиоканала
+            @param: income - кортеж (packet, rssi, received_at) от
+                    планировщика радиоканала
+        """
+        # Переменные для хранения экземпляра датчика или устройства
         __sencor = None
-        # Чтение пакета данных из радиоканала
-        income = self.rfm.read_with_cb(30)
-        # Если данные пришли, то тип income изменится на кортеж
-        # Если не пришли income == None
+        __device = None
         if type(income) == tuple:
-            # Список с полезными данными
-            __payload = income[0]
-            # Проверка на целостность пакета
-            if len(__payload) <= 1:
+            # Пакет и время его приема радиомодулем
+            __packet, __received_at = income[0], income[2]
+            # Разобрать заголовок кадра (с проверкой на целостность)
+            try:
+                __dst, __src, __type, __seq, __battery = \
+                    parse_header(__packet)
+            except FrameError:
                 log.error("Received damaged packet")
                 return
-            # Поиск экземпляра датчика
-            __sencor = self.get_sencor_by_id(__payload[1])
+            # Поиск узла по отправителю (датчики имеют приоритет)
+            __node = self.index.lookup(__src)
+            # Код типа кадра устройства: id может быть занят и датчиком
+            __device_cls = DEVICE_RADIO_TYPES.get(__type)
+            if __device_cls is not None and not isinstance(__node, Device):
+                __node = self.get_device_by_id(__src)
+            if __node is None:
+                log.error("Frame type %s from unknown node %s",
+                          __type, __src)
+                return
+            if isinstance(__node, Sencor):
+                __sencor = __node
+            elif __device_cls is None or isinstance(__node, __device_cls):
+                # Устройство (в т.ч. с незарегистрированным кодом типа)
+                __device = __node
+            else:
+                log.error("Frame type %s from %s (%s)", __type,
+                          __node.name, __node.type)
+                return
             if __sencor is not None:
+                # Отбросить повтор до разбора, учесть пропуски
+                __duplicate, __lost = self.sequences.check(__src, __seq,
+                                                           __packet)
+                if __lost:
+                    self.link_stats.frames_lost(__src, __lost)
+                if __duplicate:
+                    self.link_stats.frame_duplicate(__src)
+                    return
                 # Сконвертировать принятые данные
-                __sencor.convert_data(income[0])
-                __sencor.convert_battery(income[0])
+                __sencor.convert_data(__packet)
+                __sencor.convert_battery(__packet)
+                # Перенести крайний срок ответа
+                self.timeouts.touch(__sencor.sencor_id,
+                                    __sencor.last_response + __sencor.timeout)
                 # Вывести информацию в лог
-                log.info(__sencor.name + ":" + __sencor.value)
+                log.info("%s:%s (%s)", __sencor.name, __sencor.value,
+                         __sencor.status.name)
                 # Записать данные датчика в лог (если он нужного типа)
                 self.warden.parse_n_write(snc_id=__sencor.sencor_id,
                                           snc_type=__sencor.type,
                                           snc_val=__sencor.value,
                                           snc_time=__sencor.last_response)
-                # Обновить данные датчика в Firebase
-                try:
-                    self.firebase.update_sencor_value(__sencor)
-                except Exception as e:
-                    log.error("Error occured during sencor update")
-                    log.error("Internet might be unavailable")
-                    log.exception("message")
-            else:
-                # Поиск экземпляра устройства
-                __device = self.get_device_by_id(__payload[1])
-                # Если экземпляр найден
-                if __device is not None:
-                    # Обносить данные в памяти
-                    __device.update_device(income[0])
-                    # TODO: update data on FB
-                    # TODO: try/exc to prevent failure
+                # Данные датчика уйдут в Firebase задачей 'sencors'
+                self.mark_dirty(__sencor)
+            elif __device is not None:
+                # Обносить данные в памяти
+                __device.update_device(__packet)
+                # Кадры контроллера вне ответов на команды - маяки.
+                # Время маяка - время приема кадра модулем: время
+                # обработки включает очередь и задержки хаба
+                if __device.type == "Conditioner":
+                    self.get_beacon_predictor(__device).observe(
+                        __received_at)
+                # TODO: update data on FB
+                # TODO: try/exc to prevent failure
 
     def write(self):
         """ Метод отправки комманд из очереди в радиоканал """
         # Пока очередь команд не пуста
-        while (len(self.cmd_queue) > 0):
+        while True:
+            # Продвинуть доставку команд контроллерам кондиционеров
+            self.step_conditioners()
             # "Выдернуть" команду из очереди
-            __pack = self.cmd_queue.pop(0)
+            __pack = self.cmd_queue.get()
+            if __pack is None:
+                break
             # Сама команда
             __cmd = __pack[0]
             # Экземпляр устройства
             __dvc = __pack[1]
+            # Устройство удалено после постановки команды
+            if self.get_device_by_id(__dvc.device_id) is not __dvc:
+                continue
             # Статус отправки команды
             __status = False
+            # Условие: кадр пришел от адресата команды
+            __from_dvc = (lambda frame, d_id=__dvc.device_id:
+                          len(frame[0]) > 1 and frame[0][1] == d_id)
 
             """ Отдельный набор операций для контроллера кондиционера """
             if (__dvc.type == "Conditioner"):
-                # Время начала выполнения
-                _start = time()
-                # Если контроллеру еще не отправляли команды
-                # (т.е. прием осуществляется сразу после маякового сообщения)
-                if not __dvc.is_tamed:
-                    while (time() - _start <= 40):
-                        # Очистить событие записи
-                        self.rfm.wrt_event.clear()
-                        # Считать пакет из радиоканала
-                        __rsp = self.rfm.read_with_cb(1)
-                        # Если пришел пакет
-                        if type(__rsp) == tuple:
-                            # Если пришел маяк не от необходимого устройства
-                            if __rsp[0][1] != __dvc.device_id:
-                                # TODO: update incoming sencor
-                                continue
-                            # Ждать
-                            sleep(0.05)
-                            # Отправить команду
-                            self.rfm.send_packet(__cmd)
-                            # Обнулить событие записи
-                            self.rfm.wrt_event.clear()
-                            log.info("GOTCHA")
-                            # Ждать ответа 1 сек
-                            __rsp = self.rfm.read_with_cb(1)
-                            # Если ответа не было
-                            if type(__rsp) == tuple:
-                                __status = __dvc.check_response(__cmd[4],
-                                                                __rsp[0])
-                            # Если пришел ответ, проверить его
-                            if (__status):
-                                # Если совпадают номер отпрвленной команды и
-                                # id устройства в ответе, то считаем контроллер
-                                # "укрощенным"
-                                __dvc.is_tamed = True
-                                # Вывод в лог сообщение об успехе
-                                log.info("CONDER %s: SENT AND TAMED")
-                                # Выход из цикла while
-                                break
-                    if not __status:
-                        __dvc.rollback()
-                        self.firebase.update_device_value(__dvc)
-
-                # Если контроллер уже был в управлении
+                # Доставка идет в окнах приема контроллера без блокировки:
+                # новая команда заменяет еще не доставленную
+                __delivery = self.conditioners.get(__dvc.device_id)
+                if __delivery is None:
+                    self.conditioners[__dvc.device_id] = ConditionerDelivery(
+                        self.radio_for(__dvc.device_id), __dvc, __cmd,
+                        wakeup=self.wakeup_cmd,
+                        predictor=self.get_beacon_predictor(__dvc))
                 else:
-                    # Промежуточное хранение последнего ответа
-                    _lr = __dvc.last_response
-                    # Цикл по времени (попытки отправки в течение 26 сек)
-                    while(time() - _start < 26):
-                        # Для временного окна после маяка установить
-                        # дополнительную задержку
-                        if (round((time() - _lr) % 10) == 0):
-                            __add_gap = 0.05
-                        else:
-                            __add_gap = 0
-                        # Вычисление временного окна для отправки команды
-                        # Каждые 5 сек
-                        __t_diff = (time() - _lr) % 5
-                        # Условие вхождения во временное окно (20 мс)
-                        _time_to_send = (__t_diff <= 0.02) and (__t_diff >= 0)
-                        if (_time_to_send):
-                            sleep(__add_gap)
-                            # Отправить пакет
-                            self.rfm.send_packet(__cmd)
-                            # Очистить событие отправки
-                            self.rfm.wrt_event.clear()
-
-                            # Подождать ответ
-                            __rsp = self.rfm.read_with_cb(1)
-                            # Если ответ пришел
-                            if type(__rsp) == tuple:
-                                # Ппроверить статус ответа
-                                __status = __dvc.check_response(__cmd[3],
-                                                                __rsp[0])
-                                # При правильном ответе лог и выход из цикла
-                                if __status:
-                                    log.info("Conditioner command sent")
-                                    break
-                # Если за 26 сек команда не была отправлена
-                if not __status:
-                    # Лог ошибки
-                    __dvc.rollback()
-                    self.firebase.update_device_value(__dvc)
-                    log.info("Conditioner command sending failed")
-
+                    __delivery.update(__cmd)
                 # Возврат к изъятию команды из очереди
                 continue
 
-            # 5 попыток отправки
-            for i in range(0, 5):
-                # Установка события отправки
-                self.rfm.wrt_event.set()
-                # Отправка команды
-                self.rfm.send_packet(__cmd)
-                # Очистка события отправки
-                self.rfm.wrt_event.clear()
-
-                # Ожидпние ответа
-                __response = self.rfm.read_with_cb(1)
+            # Число попыток и время ожидания ответа зависят от качества
+            # связи с устройством
+            __attempts = self.retry.attempts(__dvc.device_id)
+            for i in range(0, __attempts):
+                # Пауза перед повтором
+                sleep(self.retry.delay(i))
+                # Отправка команды и ожидание ответа
+                __response, __rtt = self.transmit(
+                    __cmd, ack=__from_dvc,
+                    timeout=self.retry.timeout(__dvc.device_id))
 
                 # Если пришел ответ
                 if type(__response) == tuple:
                     # Проверка статуса ответа
                     __status = __dvc.check_response(__cmd[4], __response[0])
-                    # Если статус отвтеа положительный
-                    if (__status):
-                        # Лог и выход из for(0, 5)
-                        log.info("Command sent successfully")
-                        break
+                # Успешна только попытка с подтвержденным состоянием реле
+                self.retry.record_attempt(__dvc.device_id, i, __status, __rtt)
+                # Если статус отвтеа положительный
+                if (__status):
+                    # Лог и выход из цикла попыток
+                    log.info("Command sent successfully")
+                    break
+            self.retry.record_command(__dvc.device_id, i + 1, __status)
             # Если статус не был получен
             if not __status:
                 # Лог ошибки
                 log.info("Command sending failed")
                 __dvc.rollback()
                 self.firebase.update_device_value(__dvc)
-        # Очистка события отправки
-        self.rfm.wrt_event.clear()
+
+    def get_beacon_predictor(self, device):
+        """ Предсказатель окон приема контроллера (создается по запросу) """
+        __predictor = self.beacons.get(device.device_id)
+        if __predictor is None:
+            __predictor = self.beacons[device.device_id] = BeaconPredictor()
+        return __predictor
+
+    def wakeup_cmd(self):
+        """ Запустить задачу отправки команд (из потока радиоканала) """
+        self.tasks.trigger('cmd')
+
+    def step_conditioners(self):
+        """ Продвинуть доставку команд контроллерам кондиционеров """
+        for __dvc_id, __delivery in list(self.conditioners.items()):
+            __status = __delivery.step()
+            if __status is None:
+                continue
+            # Устройство могло быть удалено из другого потока
+            if self.conditioners.pop(__dvc_id, None) is None:
+                continue
+            if __status:
+                log.info("Conditioner command sent")
+            else:
+                __delivery.device.rollback()
+                self.firebase.update_device_value(__delivery.device)
+                log.info("Conditioner command sending failed")
+
+    def transmit(self, cmd, ack, timeout=1):
+        """
+            Отправить команду через радиомодуль адресата и дождаться ответа
+            @return: (кадр-ответ (packet, rssi, received_at), время ответа,
+                     сек) или (None, None) при таймауте/ошибке (в т.ч. при
+                     исчерпании бюджета эфирного времени и остановке
+                     радиоканала)
+        """
+        __future = None
+        try:
+            # Команда уходит через радиомодуль адресата (cmd[0])
+            __future = self.radio_for(cmd[0]).submit(cmd, ack=ack,
+                                                     timeout=timeout)
+            __response = __future.result(timeout=timeout + self.TX_MARGIN)
+        except Exception as e:
+            # Передача не дождалась очереди: отменить, если еще не начата
+            if __future is not None:
+                __future.cancel()
+            log.error("Error during command transmit: %r" % e)
+            return None, None
+        if __response is None:
+            return None, None
+        return __response, __future.acked_at - __future.sent_at
 
     def device_handler(self, message):
         """ Метод-обработчик сообщений от облачной базы Firebase """
@@ -341,38 +514,73 @@ class rpiHub(object):
         __inc_device_name = (message["path"].split("/"))[1]
         # Полезные данные
         __data = message["data"]
-        # Переменная для экземпляра устройства
-        __dvc2wrt = None
-
         # Поиск экземпляра устройства
-        for dvc in self.dvc_list:
-            if dvc.name == __inc_device_name:
-                __dvc2wrt = dvc
-                break
+        __dvc2wrt = self.index.get_device_by_name(__from, __inc_device_name)
 
         # Если устройство найдено
         if __dvc2wrt is not None:
             # Сформировать команду для отправки
             cmd = __dvc2wrt.form_cmd(__data)
-            # Добавить пару [команда, экземпляр] в очередь
-            self.cmd_queue.append([cmd, __dvc2wrt])
-            # Установить событие отправки команд
-            self.rfm.wrt_event.set()
-
-    def init_read_sencors(self):
-        # Инициализировать тред
-        self.read_thread = threading.Thread(name='rw', target=self.loop)
-        # Установить тред как демон
-        self.read_thread.daemon = True
-        # Запустить тред
-        self.read_thread.start()
+            # Добавить команду в очередь (заменяет ожидающую команду
+            # этого устройства)
+            __priority = self.CMD_PRIORITY.get(__dvc2wrt.type, 0)
+            self.cmd_queue.put(cmd, __dvc2wrt, priority=__priority,
+                               deadline=self.CMD_DEADLINE)
+            # Запустить отправку команд
+            self.tasks.trigger('cmd')
+
+    def get_link_stats(self):
+        """
+            Метод получения показателей качества радиоканала по узлам
+            (с именами известных датчиков и устройств)
+        """
+        __stats = self.link_stats.as_dict()
+        for __node_id, __link in __stats['nodes'].items():
+            __node = self.get_sencor_by_id(int(__node_id))
+            if __node is None:
+                __node = self.get_device_by_id(int(__node_id))
+            __link['name'] = __node.name if __node is not None else None
+            __predictor = self.beacons.get(int(__node_id))
+            if __predictor is not None:
+                __link['beacon'] = __predictor.as_dict()
+                __link['beacon']['expected_latency'] = \
+                    __predictor.expected_latency(time())
+        return __stats
+
+    def mark_dirty(self, sencor):
+        """ Отметить датчик для отправки в облако задачей 'sencors' """
+        with self.dirty_lock:
+            self.dirty_sencors[sencor.sencor_id] = sencor
+
+    def push_sencors(self):
+        """ Отправить отмеченные датчики в облако одним запросом """
+        with self.dirty_lock:
+            __sencors = list(self.dirty_sencors.values())
+            self.dirty_sencors.clear()
+        if __sencors:
+            try:
+                self.firebase.update_batch(sencors=__sencors)
+            except Exception as e:
+                log.error("Error occured during sencors update")
+                log.error("Internet might be unavailable")
+                log.exception("message")
 
     def check_sencors_timeouts(self):
-        for sencor in self.snc_list:
-            if sencor.check_timeout():
+        """
+            Проверка датчиков, чей крайний срок ответа наступил. Каждый
+            таймаут обрабатывается один раз, данные уходят в облако
+            одним запросом задачи 'sencors'
+        """
+        __expired = False
+        for __sencor_id in self.timeouts.expired(time()):
+            sencor = self.get_sencor_by_id(__sencor_id)
+            if sencor is not None and sencor.check_timeout():
                 log.error("TIMEOUT detected: %s" % sencor.name)
                 log.error("Time: %s sec" % (time() - sencor.last_response))
-                self.firebase.update_sencor_value(sencor)
+                self.mark_dirty(sencor)
+                __expired = True
+        if __expired:
+            self.tasks.trigger('sencors')
 
     # GROUPS #
 
@@ -382,12 +590,7 @@ class rpiHub(object):
             При успешном нахождении возвращает экземпляр группы
             При безуспешном поиске возвращает None
         """
-        __group = None
-        for g in self.group_list:
-            if g.name == name:
-                __group = g
-                break
-        return __group
+        return self.index.groups.get(name)
 
     def get_groups(self):
         """ Метод получения списка имен групп """
@@ -427,6 +630,7 @@ class rpiHub(object):
 
         _new_grp = Group(group_name)
         self.group_list.append(_new_grp)
+        self.index.add_group(_new_grp)
         try:
             _new_grp.dvc_stream = self.firebase.set_strm(self.device_handler,
                                                          _new_grp.name)
@@ -458,6 +662,7 @@ class rpiHub(object):
                 pass
             self.firebase.delete_group(__group.name)
             self.group_list.remove(__group)
+            self.index.remove_group(__group)
             return "OK"
 
     # SENCORS #
@@ -468,62 +673,48 @@ class rpiHub(object):
             При успешном нахождении возвращает экземпляр датчика
             При безуспешном поиске возвращает None
         """
-        __snc = None
-        for s in self.snc_list:
-            if s.sencor_id == s_id:
-                __snc = s
-                break
-        return __snc
+        return self.index.sencors.get(s_id)
 
-    def add_snc(self, snc_type, snc_id, snc_group, snc_name, restore=False):
+    def make_snc(self, snc_type, snc_id, snc_group, snc_name):
+        """
+            Создать экземпляр датчика по типу из реестра SENCOR_TYPES.
+            При неизвестном типе или группе возвращает None
+        """
+        __sencor_class = SENCOR_TYPES.get(snc_type)
+        if __sencor_class is None:
+            log.error("Unknown sencor type %s" % snc_type)
+            return None
+        if snc_group not in self.index.groups:
+            log.error("Group %s not find" % snc_group)
+            return None
+        return __sencor_class(snc_id=snc_id,
+                              group_name=snc_group,
+                              name=snc_name)
+
+    def attach_snc(self, sencor):
+        """ Добавить датчик в список датчиков хаба, индекс и группу """
+        self.snc_list.append(sencor)
+        self.index.add_sencor(sencor)
+        self.index.groups[sencor.group_name].sencors.append(sencor)
+        self.timeouts.touch(sencor.sencor_id,
+                            sencor.last_response + sencor.timeout)
+
+    def add_snc(self, snc_type, snc_id, snc_group, snc_name):
         """ Добавить датчик """
         # Проверить, существует ли уже такой датчик
         if self.get_sencor_by_id(snc_id) is not None:
             log.error("Sencor with this type/id already exists")
             return "FAIL"
 
-        # Найти экземпляр группы в списке
-        __group = self.get_group_by_name(snc_group)
-        if __group is None:
-            log.error("Group %s not find" % snc_group)
+        # Инициализировать новый датчик в зависимости от типа
+        new_sencor = self.make_snc(snc_type, snc_id, snc_group, snc_name)
+        if new_sencor is None:
             return "FAIL"
 
-        # В зависимости от типа инициализировать новый датчик
-        if snc_type == "Temperature":
-            new_sencor = TemperatureSencor(snc_id=snc_id,
-                                           group_name=snc_group,
-                                           name=snc_name)
-        elif snc_type == "Humidity":
-            new_sencor = HumiditySencor(snc_id=snc_id,
-                                        group_name=snc_group,
-                                        name=snc_name)
-        elif snc_type == "Luminosity":
-            new_sencor = LuminositySencor(snc_id=snc_id,
-                                          group_name=snc_group,
-                                          name=snc_name)
-        elif snc_type == "Door":
-            new_sencor = DoorSencor(snc_id=snc_id,
-                                    group_name=snc_group,
-                                    name=snc_name)
-        elif snc_type == "Pulse":
-            new_sencor = PulseSencor(snc_id=snc_id,
-                                     group_name=snc_group,
-                                     name=snc_name)
-        elif snc_type == "Water":
-            new_sencor = WaterCounter(snc_id=snc_id,
-                                      group_name=snc_group,
-                                      name=snc_name)
-        else:
-            log.error("Unknown sencor type")
-            return "FAIL"
-
-        # Если создается новое устройство (не восстанавливается из БД)
-        if not restore:
-            # Добавить новую запись в БД
-            sql.newSencorSettings((snc_id, snc_type, snc_group, snc_name))
+        # Добавить новую запись в БД
+        sql.newSencorSettings((snc_id, snc_type, snc_group, snc_name))
         # Добавить новый датчик в список датчиков хаба и группы
-        self.snc_list.append(new_sencor)
-        __group.sencors.append(new_sencor)
+        self.attach_snc(new_sencor)
         self.firebase.update_sencor_value(new_sencor)
         return "OK"
 
@@ -557,6 +748,11 @@ class rpiHub(object):
 
         if __sencor_for_delete is not None:
             self.snc_list.remove(__sencor_for_delete)
+            self.index.remove_sencor(__sencor_for_delete)
+            self.timeouts.remove(snc_id)
+            self.sequences.forget(snc_id)
+            with self.dirty_lock:
+                self.dirty_sencors.pop(snc_id, None)
             __group = self.get_group_by_name(__sencor_for_delete.group_name)
             __group.sencors.remove(__sencor_for_delete)
             sql.deleteSencor(snc_id)
@@ -574,58 +770,59 @@ class rpiHub(object):
             При успешном нахождении возвращает экземпляр устройства
             При безуспешном поиске возвращает None
         """
-        __dvc = None
-        for d in self.dvc_list:
-            if d.device_id == d_id:
-                __dvc = d
-                break
-        return __dvc
+        return self.index.devices.get(d_id)
+
+    def make_dvc(self, dvc_type, dvc_id, dvc_group, dvc_name, ch0name=None,
+                 ch1name=None, last_val=None):
+        """
+            Создать экземпляр устройства по типу из реестра DEVICE_TYPES.
+            При неизвестном типе или группе возвращает None
+        """
+        __device_class = DEVICE_TYPES.get(dvc_type)
+        if __device_class is None:
+            log.error("Unknown device type %s" % dvc_type)
+            return None
+        if dvc_group not in self.index.groups:
+            log.error("Group %s not find" % dvc_group)
+            return None
+        return __device_class.from_settings(dvc_id=dvc_id,
+                                            group_name=dvc_group,
+                                            name=dvc_name,
+                                            ch0name=ch0name,
+                                            ch1name=ch1name,
+                                            last_val=last_val)
+
+    def attach_dvc(self, device):
+        """ Добавить устройство в список устройств хаба, индекс и группу """
+        self.dvc_list.append(device)
+        self.index.add_device(device)
+        self.index.groups[device.group_name].devices.append(device)
 
     def add_dvc(self, dvc_type, dvc_id, dvc_group, dvc_name, ch0name=None,
-                ch1name=None, last_val=None, restore=False):
+                ch1name=None, last_val=None):
         """ Добавить устройство """
         # Проверить, существует ли уже такое устройство
         if self.get_device_by_id(dvc_id) is not None:
             log.error("Device with this id already exists")
             return "FAIL"
 
-        # Найти экземпляр группы в списке
-        __group = self.get_group_by_name(dvc_group)
-        if __group is None:
-            log.error("Group %s not find" % dvc_group)
-            return "FAIL"
-
-        # В зависимости от типа инициализировать новый датчик
-        if dvc_type == "Relay":
-            new_device = Relay(dvc_id=dvc_id,
-                               group_name=dvc_group,
-                               name=dvc_name,
-                               ch0name=ch0name,
-                               ch1name=ch1name,
-                               last_val=last_val)
-        elif dvc_type == "Conditioner":
-            new_device = Conditioner(dvc_id=dvc_id,
-                                     group_name=dvc_group,
-                                     name=dvc_name,
-                                     last_val=last_val)
-        else:
-            log.error("Unknown device type")
+        # Инициализировать новое устройство в зависимости от типа
+        new_device = self.make_dvc(dvc_type, dvc_id, dvc_group, dvc_name,
+                                   ch0name, ch1name, last_val)
+        if new_device is None:
             return "FAIL"
 
-        # Если создается новое устройство (не восстанавливается из БД)
-        if not restore:
-            # Добавить новую запись в БД
-            __dvc_settings = (dvc_id,
-                              dvc_type,
-                              dvc_group,
-                              dvc_name,
-                              ch0name,
-                              ch1name,
-                              0)
-            sql.newDeviceSettings(__dvc_settings)
+        # Добавить новую запись в БД
+        __dvc_settings = (dvc_id,
+                          dvc_type,
+                          dvc_group,
+                          dvc_name,
+                          ch0name,
+                          ch1name,
+                          0)
+        sql.newDeviceSettings(__dvc_settings)
         # Добавить новое устройство в список устройств хаба и группы
-        self.dvc_list.append(new_device)
-        __group.devices.append(new_device)
+        self.attach_dvc(new_device)
         # TODO: init stuff in first/recover send
         self.firebase.update_device_value(new_device)
         return "OK"
@@ -644,6 +841,7 @@ class rpiHub(object):
             __old_group = self.get_group_by_name(__device_for_edit.group_name)
             __old_group.devices.remove(__device_for_edit)
             self.firebase.delete_device(__device_for_edit)
+            self.index.remove_device(__device_for_edit)
 
             __device_for_edit.group_name = new_dvc_group
             __device_for_edit.name = new_dvc_name
@@ -651,6 +849,7 @@ class rpiHub(object):
                 __device_for_edit.ch0name = new_ch0name
                 __device_for_edit.ch1name = new_ch1name
             __new_group.devices.append(__device_for_edit)
+            self.index.add_device(__device_for_edit)
             self.firebase.update_device_value(__device_for_edit)
             __dvc_settings = (new_dvc_group,
                               new_dvc_name,
@@ -669,6 +868,16 @@ class rpiHub(object):
 
         if __device_for_delete is not None:
             self.dvc_list.remove(__device_for_delete)
+            self.index.remove_device(__device_for_delete)
+            # Прекратить доставку и забыть состояние узла
+            __delivery = self.conditioners.pop(dvc_id, None)
+            if __delivery is not None:
+                __delivery.cancel()
+            self.cmd_queue.remove(dvc_id)
+            self.retry.forget(dvc_id)
+            self.beacons.pop(dvc_id, None)
+            self.node_radio.pop(dvc_id, None)
+            self.pinned_radio.pop(dvc_id, None)
             __group = self.get_group_by_name(__device_for_delete.group_name)
             __group.devices.remove(__device_for_delete)
             sql.deleteDevice(dvc_id)
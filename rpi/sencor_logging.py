@@ -76,25 +76,17 @@ class Warden(object):
         self.cancel = False
 
     def parse_n_write(self, snc_id, snc_type, snc_val, snc_time):
-        """ Метод конкатенации данных и записи в файл """
+        """
+            Метод записи показания в файл
+            @param: snc_val - числовое показание датчика,
+                    None при ошибке (не записывается)
+        """
         # Преемлемые типы датчиков
         __acceptable_types = ["Water"]
-        # Если тип датчика подходит
-        if snc_type in __acceptable_types:
-            # Выделить числовой показатель по разделителю пробела
-            __splitted_val = snc_val.split(" ")
-            # Если пробела нет, то данные - "ошибка" или "таймаут"
-            if len(__splitted_val) == 0:
-                # Не записывать и вернуться
-                return
-            else:
-                # Забрать числовой показатель
-                __fmt_val = __splitted_val[0]
-
-            # Конкатенация строки
-            _row = str(snc_id) + "," + __fmt_val
+        # Если тип датчика подходит и показание действительно
+        if snc_type in __acceptable_types and snc_val is not None:
             # Запись в файл
-            log.info(_row)
+            log.info("%s,%s", snc_id, snc_val)
 
     def stream_handler(self, message):
         """ Обработчик команд статистики """
@@ -2,19 +2,107 @@
 # -*- coding: utf8 -*-
 # Author: Antipin S.O. @RLDA
 
+import struct
+from enum import IntEnum
 from time import time
 from datetime import datetime
 
 # TEMP: # DEBUG: # XXX:
 from random import randint
 
+from .frame import HEADER, BATTERY, payload_uint16, payload_uint32
+
 import logging
 
 log = logging.getLogger(__name__)
 
+# Общие константы разбора кадров (их же использует пакетный декодер
+# rpi.batch_decode)
+# Код ошибки датчика в данных
+ERROR_CODE = 0xFF
+# Значащие биты показаний датчика температуры и их масштаб (0.1 °C)
+TEMPERATURE_MASK = 0xFFF
+TEMPERATURE_SCALE = 10.0
+# Импульсов счетчика электроэнергии на КВт*ч
+PULSES_PER_KWH = 3200.0
+# Литров на импульс счетчика воды
+LITRES_PER_PULSE = 10
+
+
+def battery_percent(volt_byte):
+    """
+        Процент заряда батареи по байту напряжения из кадра
+        (напряжение в сотых вольта минус 150)
+    """
+    # Непосредственное значение напряжения из принятого пакета данных
+    __volt_raw = volt_byte + 150
+    # Номинальное напряжение полного заряда батареи
+    __volt_full = 330
+    # Номинальное напряжения разряда батареи
+    __volt_low = 260
+    # Разница полного заряда-разряда
+    __volt_range = __volt_full - __volt_low
+    # Вычисление процентного соотношения текущего заряда к номиналам
+    _volt_calc = int(((__volt_raw - __volt_low)*100)/__volt_range)
+    # NOTE: ацп или формула вычисления на устройствах барахлит,
+    # поэтому не исключены случаи выхода за границы номиналов,
+    # поэтому нужно зафиксировать минимальное и максимальное значения
+    return min(100, max(0, _volt_calc))
+
+
+# Процент заряда батареи для каждого значения байта напряжения
+BATTERY_TABLE = tuple(battery_percent(__byte) for __byte in range(256))
+
+# Реестр классов датчиков: имя типа -> класс
+SENCOR_TYPES = {}
+
+
+def register_sencor(type_name):
+    """
+        Декоратор регистрации класса датчика в реестре типов.
+        Позволяет добавлять новые типы датчиков без изменения хаба.
+        @param: type_name - имя типа (как в БД и REST API)
+    """
+    def decorator(cls):
+        SENCOR_TYPES[type_name] = cls
+        return cls
+    return decorator
+
+
+class SencorStatus(IntEnum):
+    """ Состояние показаний датчика """
+    # Показаний еще не было
+    NO_DATA = 0
+    # Показания действительны
+    OK = 1
+    # Датчик сообщил об ошибке измерения
+    ERROR = 2
+    # Датчик не отвечает дольше таймаута (показания устарели)
+    TIMEOUT = 3
+
 
 class Sencor(object):
-    """ Родительский класс датчиков """
+    """
+        Родительский класс датчиков.
+
+        Показания хранятся числом (value) вместе с состоянием (status);
+        строковое представление формируется только при отправке данных
+        методами render_value/render_battery.
+
+        Экземпляры без __dict__ (__slots__): хаб держит в памяти все узлы.
+        Тип, таймаут и единицы измерения - атрибуты класса, наследники
+        объявляют собственные __slots__ (хотя бы пустые)
+    """
+    __slots__ = ('sencor_id', 'group_name', 'name', 'value', 'status',
+                 'battery', 'last_response')
+
+    # Тип датчика
+    type = None
+    # Таймаут ответа датчика, сек
+    timeout = 1080
+    # Единицы измерения показаний
+    unit = ''
+
     def __init__(self, snc_id, group_name, name):
         # Идентификатор
         self.sencor_id = snc_id
@@ -22,10 +110,12 @@ class Sencor(object):
         self.group_name = group_name
         # Собственное имя
         self.name = name
-        # Значение по умолчанию
-        self.value = '-'
-        # Заряд батареи
-        self.battery = '-'
+        # Последнее показание (число) или None
+        self.value = None
+        # Состояние показаний
+        self.status = SencorStatus.NO_DATA
+        # Заряд батареи, % или None
+        self.battery = None
         # Время последнего ответа
         self.last_response = time()
 
@@ -49,185 +139,189 @@ class Sencor(object):
         data = {
             self.name + '/snc_type': self.type,
             self.name + '/id': self.sencor_id,
-            self.name + '/value': self.value,
-            self.name + '/battery': self.battery,
+            self.name + '/value': self.render_value(),
+            self.name + '/battery': self.render_battery(),
             self.name + '/last_response': _time
         }
         # Вернуть выходной пакет данных
         return data
 
+    def render_value(self):
+        """ Строковое представление показаний с учетом состояния """
+        if self.status == SencorStatus.OK:
+            return self.format_value()
+        elif self.status == SencorStatus.ERROR:
+            return "Ошибка датчика"
+        elif self.status == SencorStatus.TIMEOUT:
+            return "Таймаут"
+        return '-'
+
+    def format_value(self):
+        """ Строковое представление действительного показания """
+        return str(self.value) + " " + self.unit
+
+    def render_battery(self):
+        """ Строковое представление заряда батареи """
+        if self.battery is None:
+            return '-'
+        return str(self.battery) + " %"
+
+    def set_value(self, value):
+        """ Записать действительное показание """
+        self.value = value
+        self.status = SencorStatus.OK
+
+    def set_error(self):
+        """ Отметить ошибку измерения """
+        self.value = None
+        self.status = SencorStatus.ERROR
+
     def check_timeout(self):
         """ Метод проверки таймаута ответа """
         # Если время последнего ответа больше чем текущее на период таймаута
         if (time() - self.last_response >= self.timeout):
-            # Установить данные в Таймаут
-            self.value = "Таймаут"
+            # Отметить показания устаревшими
+            self.status = SencorStatus.TIMEOUT
             # Вернуть истину
             return True
         else:
             return False
 
-    def convert_battery(self, income):
-        """ Метод вычисления процента заряда батареи """
-        # Если длина массива достаточная
-        if len(income) >= 5:
-            # Непосредственное значение напряжения из принятого пакета данных
-            __volt_raw = income[4] + 150
-            # Номинальное напряжение полного заряда батареи
-            __volt_full = 330
-            # Номинальное напряжения разряда батареи
-            __volt_low = 260
-            # Разница полного заряда-разряда
-            __volt_range = __volt_full - __volt_low
-            # Вычисление процентного соотношения текущего заряда к номиналам
-            _volt_calc = int(((__volt_raw - __volt_low)*100)/__volt_range)
-            # NOTE: ацп или формула вычисления на устройствах барахлит,
-            # поэтому не исключены случаи выхода за границы номиналов,
-            # поэтому нужно зафиксировать минимальное и максимальное значения
-            if _volt_calc > 100:
-                _volt_calc = 100
-            elif _volt_calc < 0:
-                _volt_calc = 0
-
-            # Вывести значение процента напряжения в лог
-            log.info("Battery level of %s: %s" % (self.name, _volt_calc))
-            # Установить значение заряда для экземпляра объекта
-            self.battery = str(_volt_calc) + " %"
+    def convert_battery(self, packet):
+        """ Метод вычисления процента заряда батареи из пакета """
+        _volt_calc = BATTERY_TABLE[packet[BATTERY]]
 
+        # Вывести значение процента напряжения в лог
+        log.info("Battery level of %s: %s", self.name, _volt_calc)
+        # Установить значение заряда для экземпляра объекта
+        self.battery = _volt_calc
 
+
+@register_sencor("Temperature")
 class TemperatureSencor(Sencor):
     """ Класс датчиков температуры """
-    def __init__(self, snc_id, group_name, name):
-        # Инициализация родительского класса
-        super(TemperatureSencor, self).__init__(snc_id, group_name, name)
-        # Тип датчика
-        # TODO: send type to fb on init to ease data parsing
-        self.type = 'Temperature'
+    __slots__ = ()
 
-        # Таймаут ответа датчика
-        self.timeout = 1080
+    # Тип датчика
+    type = 'Temperature'
+    # Единицы измерения
+    unit = "°C"
 
-    def convert_data(self, income_array):
+    def convert_data(self, packet):
         """
-            Конвертация принятых данных
+            Конвертация принятых данных из пакета
         """
         # Обновить время последнего ответа от устройства
         self.last_response = time()
 
-        # Младший байт данных
-        __data_lb = income_array[5]
-        # Старший байт данных
-        __data_sb = income_array[6] << 8
-
-        # Побитовое сложение байтов
-        __data_sum = (__data_lb | __data_sb) & 0xFFF
+        # 12 бит данных (младший байт первым)
+        __data_sum = payload_uint16(packet)[0] & TEMPERATURE_MASK
 
         # Если пришли данные с кодом ошибки
-        if __data_sum in [0xFF]:
+        if __data_sum == ERROR_CODE:
             # Установить ошибку данных
-            self.value = "Ошибка датчика"
+            self.set_error()
         else:
-            # Строковая конкатенация показаний датчика и единиц измерения
-            self.value = str(__data_sum/10.00) + " °C"
+            # Температура в градусах
+            self.set_value(__data_sum/TEMPERATURE_SCALE)
 
 
+@register_sencor("Humidity")
 class HumiditySencor(Sencor):
     """ Класс датчиков температуры """
-    def __init__(self, snc_id, group_name, name):
-        # Инициализация родительского класса
-        super(HumiditySencor, self).__init__(snc_id, group_name, name)
-        # Тип датчика
-        self.type = 'Humidity'
+    __slots__ = ()
 
-        # Таймаут ответа
-        self.timeout = 1080
+    # Тип датчика
+    type = 'Humidity'
+    # Единицы измерения
+    unit = "%"
 
-    def convert_data(self, income_array):
+    def convert_data(self, packet):
         # TBD
         pass
 
     def get_random_state(self):
         """ Debug-метод со случайными занчениями """
-        self.value = str(randint(35, 50)) + " %"
+        self.set_value(randint(35, 50))
 
 
+@register_sencor("Luminosity")
 class LuminositySencor(Sencor):
     """ Класс датчиков температуры """
-    def __init__(self, snc_id, group_name, name):
-        # Инициализация родительского класса
-        super(LuminositySencor, self).__init__(snc_id, group_name, name)
-        # Тип датчика
-        self.type = 'Luminosity'
+    __slots__ = ()
 
-        # Таймаут ответа
-        self.timeout = 1080
+    # Тип датчика
+    type = 'Luminosity'
+    # Единицы измерения
+    unit = "люкс"
 
-    def convert_data(self, income_array):
+    def convert_data(self, packet):
         """
-            Конвертация принятых данных
+            Конвертация принятых данных из пакета
         """
         # Обновить время последнего ответа от датчика
         self.last_response = time()
 
-        # Младший байт данных
-        __data_lb = income_array[5]
-        # Старший байт данных
-        __data_sb = income_array[6] << 8
-
-        # Побитовое сложение
-        __data_sum = (__data_lb | __data_sb)
+        # 16 бит данных (младший байт первым)
+        __data_sum = payload_uint16(packet)[0]
 
         # Если показания указывают на ошибку измерений
-        if __data_sum in [0xFF]:
-            self.value = "Ошибка датчика"
+        if __data_sum == ERROR_CODE:
+            self.set_error()
         else:
-            # Строковая конкатенация данных датчика и единиц измерения
-            self.value = str(__data_sum) + " люкс"
+            # Освещенность в люксах
+            self.set_value(__data_sum)
 
 
+@register_sencor("Door")
 class DoorSencor(Sencor):
     """ Класс датчиков открытия двери """
-    def __init__(self, snc_id, group_name, name):
-        # Инициализация родительского класса
-        super(DoorSencor, self).__init__(snc_id, group_name, name)
-        # Тип датчика
-        self.type = 'Door'
+    __slots__ = ()
 
-        # Таймаут ответа
-        self.timeout = 1080
+    # Тип датчика
+    type = 'Door'
 
-    def convert_data(self, data):
+    def convert_data(self, packet):
         # Обновить время последнего ответа от датчика
         self.last_response = time()
 
         # Младший байт данных
-        __data_lb = data[7]
+        __data_lb = packet[HEADER.size + 2]
 
         # Если данные указывают на ошибку датчика
-        if __data_lb in [0xFF]:
-            self.value = "Ошибка датчика"
+        if __data_lb == ERROR_CODE:
+            self.set_error()
         else:
-            # Тернарный оператор присвоения строки в зависимости от бита
-            self.value = "Закрыто" if __data_lb == 0 else "Открыто"
+            # 0 - дверь закрыта, 1 - открыта
+            self.set_value(0 if __data_lb == 0 else 1)
 
+    # @override
+    def format_value(self):
+        return "Закрыто" if self.value == 0 else "Открыто"
 
+
+@register_sencor("Pulse")
 class PulseSencor(Sencor):
     """ Класс счетчиков импульсов """
+    __slots__ = ('prev_pulses', 'pow', 'kwt', 'period_pwr')
+
+    # Тип датчика
+    type = 'Pulse'
+    # Таймаут ответа
+    timeout = 3605
+
     def __init__(self, snc_id, group_name, name):
         # Инициализация родительского класса
         super(PulseSencor, self).__init__(snc_id, group_name, name)
-        # Тип датчика
-        self.type = 'Pulse'
-
-        # Таймаут ответа
-        self.timeout = 3605
 
         # Предыдущее значение количества импульсов
         self.prev_pulses = 0
-        # Мощность
+        # Мощность, Вт
         self.pow = 0.0
         # КВт*ч
         self.kwt = 0.0
+        # Период между ответами, мин
+        self.period_pwr = 0.0
 
     # @override
     def form_data(self):
@@ -240,87 +334,78 @@ class PulseSencor(Sencor):
         data = {
             self.name + '/snc_type': self.type,
             self.name + '/id': self.sencor_id,
-            self.name + "/КВт*ч": self.kwt,
-            self.name + "/Мощность": self.pow,
-            self.name + '/battery': self.battery,
+            self.name + "/КВт*ч": "%.2f" % self.kwt,
+            self.name + "/Мощность": "%.2f Вт" % self.pow,
+            self.name + '/battery': self.render_battery(),
             self.name + '/last_response': _time
         }
         # Вернуть сформированный словарь
         return data
 
-    def convert_data(self, data):
+    def convert_data(self, packet):
         """
-            Конвертация принятых данных
+            Конвертация принятых данных из пакета
         """
         # Период (время между ответами в минутах)
         self.period_pwr = (time() - self.last_response)/60
         # Обновление времени последнего ответа датчика
         self.last_response = time()
 
-        # Количество импульсов
-        __pulses = 0
         try:
-            # Побитовая конкатенация количества импульсов
-            for i in range(0, 4):
-                # Текущий бит со смещением
-                __tmp = data[5+i] << (8*i)
-                # Сложение с предыдущими показаниями
-                __pulses = __pulses | __tmp
-        except Exception:
+            # 32 бита количества импульсов (младший байт первым)
+            __pulses = payload_uint32(packet)[0]
+        except struct.error:
             # Обработка исключений
             log.warn("Cant calc total pulses in Pulse:%s" % self.sencor_id)
-            log.info("Data length: %s" % len(data))
+            log.info("Data length: %s" % len(packet))
+            self.set_error()
             return
-        finally:
-            # Строковое представление КВТ*ч с точностью до 2 знаков после зпт
-            self.kwt = "%.2f" % (__pulses/3200.00)
-            log.info("kwt: %s" % self.kwt)
-
-            if self.prev_pulses != 0:
-                # Если датчик отвечает не в первый раз
-                # Посчитать разность показаний двух ответов и поделить на
-                # период между ответами
-                __pow = (__pulses - self.prev_pulses) * 1.125 / self.period_pwr
-                # Строковое представление мощность с единицами измерения
-                # Точность: 2 знака после запятой
-                self.pow = "%.2f Вт" % (__pow)
-            else:
-                # Если датчик вещает впервые
-                self.pow = "0 Вт"
-            # Запомнить последнее значения количества импульсов
-            self.prev_pulses = __pulses
-            log.info("pow: %s" % self.pow)
+
+        # Потребленная энергия, КВт*ч
+        self.kwt = __pulses/PULSES_PER_KWH
+        self.set_value(self.kwt)
+        log.info("kwt: %.2f", self.kwt)
+
+        if self.prev_pulses != 0:
+            # Если датчик отвечает не в первый раз
+            # Посчитать разность показаний двух ответов и поделить на
+            # период между ответами
+            self.pow = (__pulses - self.prev_pulses) * 1.125 / self.period_pwr
+        else:
+            # Если датчик вещает впервые
+            self.pow = 0.0
+        # Запомнить последнее значения количества импульсов
+        self.prev_pulses = __pulses
+        log.info("pow: %.2f", self.pow)
 
 
+@register_sencor("Water")
 class WaterCounter(Sencor):
     """ Клас импульсных счетчиков потребления воды """
-    def __init__(self, snc_id, group_name, name):
-        super(WaterCounter, self).__init__(snc_id, group_name, name)
-        # Тип датчика
-        self.type = "Water"
+    __slots__ = ()
 
-        # Таймаут ответа
-        self.timeout = 3605
+    # Тип датчика
+    type = "Water"
+    # Таймаут ответа
+    timeout = 3605
+    # Единицы измерения
+    unit = "л"
 
-    def convert_data(self, data):
+    def convert_data(self, packet):
         """
-            Конвертация принятых данных
+            Конвертация принятых данных из пакета
         """
 
         # Обновить время последнего ответа
         self.last_response = time()
 
-        # Инициализация значения числа импульсов
-        __pulses = 0
         try:
-            # Побитовая конкатенация показаний количества импульсов
-            for i in range(0, 4):
-                # Текущий бит со смещением
-                __tmp = data[5+i] << (8*i)
-                # Конкатенация с предыдущими показаниями
-                __pulses = __pulses | __tmp
-        except Exception as e:
+            # 32 бита количества импульсов (младший байт первым)
+            __pulses = payload_uint32(packet)[0]
+        except struct.error as e:
             log.error("Cant calculate pulses on water counter: %s" % self.name)
+            self.set_error()
+            return
 
-        # Записать строковое значение датчика
-        self.value = str(__pulses * 10) + " л"
+        # Потребленный объем, литры
+        self.set_value(__pulses * LITRES_PER_PULSE)
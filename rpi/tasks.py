@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+
+import threading
+from time import time
+
+from .rfm69_lib.stats import Histogram
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class PeriodicTask(object):
+    """
+        Служебная задача хаба в собственном потоке.
+
+        Выполняется раз в interval секунд или сразу по событию (trigger).
+        Запуски одной задачи никогда не перекрываются: если выполнение
+        затянулось дольше периода, пропущенные запуски не копятся в
+        очередь, а учитываются в счетчике overruns, и следующий запуск
+        происходит сразу же. Медленная задача задерживает только себя.
+        Задача с next_due запускается к сроку, который та возвращает,
+        но не реже раза в interval секунд.
+    """
+    def __init__(self, name, target, interval, evented=False, next_due=None):
+        """
+            @param: name - имя задачи (и потока)
+            @param: target - функция без аргументов
+            @param: interval - период запуска, сек
+            @param: evented - запускать ли задачу по trigger() до истечения
+                    периода
+            @param: next_due - функция без аргументов, возвращающая время
+                    (time()) следующего запуска или None - через interval
+        """
+        self.name = name
+        self.target = target
+        self.interval = interval
+        self.evented = evented
+        self.next_due = next_due
+        # Событие внеочередного запуска или остановки
+        self.event = threading.Event()
+        self.running = False
+        self.thread = None
+
+        # Время выполнения
+        self.duration = Histogram()
+        # Задержка запуска относительно срока или события
+        self.lag = Histogram()
+        self.runs = 0
+        self.failures = 0
+        self.overruns = 0
+        self.triggers = 0
+        self.trigger_at = None
+        self.last_run = None
+
+    def start(self):
+        """ Запустить поток задачи """
+        self.running = True
+        self.thread = threading.Thread(name=self.name, target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """ Остановить поток задачи """
+        self.running = False
+        self.event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def trigger(self):
+        """ Запустить задачу вне очереди """
+        if self.evented:
+            self.triggers += 1
+            self.trigger_at = time()
+            self.event.set()
+
+    def run(self):
+        """ Loop-worker потока задачи """
+        __due = time()
+        while self.running:
+            __wait = __due - time()
+            __triggered = __wait > 0 and self.event.wait(__wait)
+            self.event.clear()
+            if not self.running:
+                return
+
+            __start = time()
+            self.lag.add(max(0.0, __start - (self.trigger_at if __triggered
+                                             else __due)))
+            try:
+                self.target()
+            except Exception:
+                self.failures += 1
+                log.exception("Task %s failed" % self.name)
+            __end = time()
+            self.runs += 1
+            self.last_run = __end
+            self.duration.add(__end - __start)
+
+            # Следующий запуск отсчитывается от начала текущего
+            __due = __start + self.interval
+            if __due <= __end:
+                self.overruns += int((__end - __start) // self.interval)
+                __due = __end
+            __next = self._next_due()
+            if __next is not None:
+                __due = max(min(__due, __next), __end)
+
+    def _next_due(self):
+        """ Срок следующего запуска от next_due или None """
+        if self.next_due is None:
+            return None
+        try:
+            return self.next_due()
+        except Exception:
+            log.exception("Task %s next_due failed" % self.name)
+            return None
+
+    def get_stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'failures': self.failures,
+            'overruns': self.overruns,
+            'triggers': self.triggers,
+            'last_run': self.last_run,
+            'duration': self.duration.as_dict(),
+            'lag': self.lag.as_dict(),
+        }
+
+
+class TaskScheduler(object):
+    """ Набор служебных задач хаба, каждая в своем потоке """
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, name, target, interval, evented=False, next_due=None):
+        """ Добавить задачу (см. PeriodicTask) """
+        self.tasks[name] = PeriodicTask(name, target, interval, evented,
+                                        next_due)
+        return self.tasks[name]
+
+    def start(self):
+        for task in self.tasks.values():
+            task.start()
+
+    def stop(self):
+        for task in self.tasks.values():
+            task.stop()
+
+    def trigger(self, name):
+        """ Запустить задачу name вне очереди """
+        self.tasks[name].trigger()
+
+    def get_stats(self):
+        """ Статистика выполнения задач """
+        return dict((name, task.get_stats())
+                    for name, task in self.tasks.items())
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+# Author: Antipin S.O. @RLDA
+
+import heapq
+import threading
+
+
+class TimeoutHeap(object):
+    """
+        Крайние сроки ответа узлов в min-куче.
+
+        Каждый кадр переносит срок узла (touch), старые записи в куче не
+        удаляются, а пропускаются при извлечении. Срок срабатывает один
+        раз: после expired() узел выпадает из учета до следующего кадра.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Куча [крайний срок, id узла]
+        self.heap = []
+        # Id узла -> действующий крайний срок
+        self.deadlines = {}
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def touch(self, node_id, deadline):
+        """ Установить крайний срок ответа узла """
+        with self.lock:
+            self.deadlines[node_id] = deadline
+            heapq.heappush(self.heap, [deadline, node_id])
+            # Сжать кучу, если устаревших записей стало больше действующих
+            if len(self.heap) > 2 * len(self.deadlines) + 64:
+                self.heap = [[d, n] for n, d in self.deadlines.items()]
+                heapq.heapify(self.heap)
+
+    def remove(self, node_id):
+        """ Перестать отслеживать узел """
+        with self.lock:
+            self.deadlines.pop(node_id, None)
+
+    def next_deadline(self):
+        """ Ближайший действующий крайний срок или None """
+        with self.lock:
+            self._skip_stale()
+            return self.heap[0][0] if self.heap else None
+
+    def expired(self, now):
+        """ Id узлов, чей срок наступил к моменту now (каждый - один раз) """
+        __expired = []
+        with self.lock:
+            while True:
+                self._skip_stale()
+                if not self.heap or self.heap[0][0] > now:
+                    return __expired
+                __deadline, __node_id = heapq.heappop(self.heap)
+                del self.deadlines[__node_id]
+                __expired.append(__node_id)
+
+    def _skip_stale(self):
+        while self.heap and \
+                self.deadlines.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)